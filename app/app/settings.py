@@ -55,6 +55,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.instrumentation.InstrumentationMiddleware',
+    'core.slow_queries.SlowQueryViewMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,15 +91,151 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Connections are kept open per worker thread for DB_CONN_MAX_AGE seconds
+# (0 closes them after every request) and checked before each reuse.
+# Set DB_POOL_MODE=transaction when DB_HOST is a transaction-pooling
+# pgbouncer: server-side cursors cannot span its transactions.
+DB_POOL_MODE = os.environ.get('DB_POOL_MODE', '')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
+        'PORT': os.environ.get('DB_PORT', ''),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'DISABLE_SERVER_SIDE_CURSORS': DB_POOL_MODE == 'transaction',
+    }
+}
+
+DB_HEALTH_CHECKS = bool(int(os.environ.get('DB_HEALTH_CHECKS', 1)))
+# Seconds a connection that passed a health check, or served a request
+# without errors, is trusted without another round trip; 0 checks on every
+# request.
+DB_HEALTH_CHECK_INTERVAL = int(
+    os.environ.get('DB_HEALTH_CHECK_INTERVAL', 30)
+)
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# The in-process locmem cache is per worker. For multi-worker deployments
+# point CACHE_BACKEND/CACHE_LOCATION at a shared backend with atomic
+# counters, e.g. django.core.cache.backends.redis.RedisCache; the login
+# throttles refuse the file-based cache, whose add() and incr() are not.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
+if CACHES['default']['BACKEND'].endswith(('LocMemCache', 'FileBasedCache')):
+    # Redis and memcached evict on their own and take no such option.
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 10000)),
+    }
+
+# List response caching defaults to on only with a shared cache backend:
+# with the per-process locmem cache a write would invalidate the cached
+# pages of the worker that handled it and no other.
+RESPONSE_CACHE_ENABLED = (
+    bool(int(os.environ['RESPONSE_CACHE']))
+    if 'RESPONSE_CACHE' in os.environ else None
+)
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300))
+
+
+# Per-request instrumentation: query counts and timings are reported in a
+# Server-Timing header and aggregated at /api/metrics/.
+INSTRUMENTATION_ENABLED = bool(int(os.environ.get('INSTRUMENTATION', 1)))
+INSTRUMENTATION_SERVER_TIMING = bool(
+    int(os.environ.get('INSTRUMENTATION_SERVER_TIMING', 1))
+)
+# Requests running one SQL shape this many times are flagged as N+1.
+INSTRUMENTATION_N_PLUS_ONE_THRESHOLD = 5
+# Required to serve /api/metrics/ unless DEBUG is on.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Every worker writes its metrics to a file in METRICS_DIR, which the
+# metrics view sums; without it only the serving worker is reported.
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1))
+
+# Token-authenticated users are cached per process for safe requests;
+# user and token changes invalidate them through the default cache. So
+# that a revoked token stops working in every worker, the cache defaults
+# to on only when the default cache is shared by the workers.
+AUTH_TOKEN_CACHE_ENABLED = (
+    bool(int(os.environ['AUTH_TOKEN_CACHE']))
+    if 'AUTH_TOKEN_CACHE' in os.environ else None
+)
+AUTH_TOKEN_CACHE_TTL = int(os.environ.get('AUTH_TOKEN_CACHE_TTL', 60))
+AUTH_TOKEN_CACHE_MAX_ENTRIES = 10000
+# Build the user of JWT-authenticated reads from the token claims.
+AUTH_JWT_STATELESS_READS = bool(
+    int(os.environ.get('AUTH_JWT_STATELESS_READS', 1))
+)
+
+# Statements slower than the threshold are logged as JSON lines; with
+# SLOW_QUERY_EXPLAIN their plans are captured too (SELECTs only, at most
+# once per statement shape and interval). See the slow_queries command.
+SLOW_QUERY_LOG_ENABLED = bool(int(os.environ.get('SLOW_QUERY_LOG', 1)))
+SLOW_QUERY_THRESHOLD_MS = float(
+    os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200)
+)
+SLOW_QUERY_EXPLAIN = bool(int(os.environ.get('SLOW_QUERY_EXPLAIN', 0)))
+SLOW_QUERY_EXPLAIN_INTERVAL = 300
+SLOW_QUERY_LOG_FILE = os.environ.get(
+    'SLOW_QUERY_LOG_FILE',
+    '/vol/web/logs/slow_queries.log',
+)
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+
+
+# Password hashing
+# PBKDF2 iterations are configurable; stored hashes with other parameters
+# are upgraded on the next login. Login hashing runs in a per-process
+# pool of PASSWORD_HASH_WORKERS threads. A login's request thread waits
+# for its hash, so logins beyond PASSWORD_HASH_MAX_PENDING get a 503,
+# and the limit must stay below the UWSGI_THREADS of a worker to leave
+# threads for other requests; it defaults to one less.
+PASSWORD_HASHERS = [
+    'core.passwords.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = int(
+    os.environ.get('PASSWORD_HASH_ITERATIONS', 320000)
+)
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 1))
+UWSGI_THREADS = int(os.environ.get('UWSGI_THREADS', 4))
+PASSWORD_HASH_MAX_PENDING = int(
+    os.environ.get('PASSWORD_HASH_MAX_PENDING', max(UWSGI_THREADS - 1, 1))
+)
+AUTHENTICATION_BACKENDS = ['core.passwords.PooledModelBackend']
+
+
+# Login and sign-up throttling (see core.throttling). The 'cache' store
+# is shared between workers when the cache backend is; 'local' keeps the
+# counters in each process, multiplying the limits by the worker count.
+# `check --deploy` fails when the 'cache' store has a per-process cache.
+LOGIN_THROTTLE_ENABLED = bool(int(os.environ.get('LOGIN_THROTTLE', 1)))
+LOGIN_THROTTLE_STORE = os.environ.get('LOGIN_THROTTLE_STORE', 'cache')
+LOGIN_THROTTLE_LOCAL_MAX_KEYS = 100000
+LOGIN_THROTTLE_RATES = {
+    'login_ip': os.environ.get('LOGIN_THROTTLE_IP_RATE', '20/min'),
+    'login_email': os.environ.get('LOGIN_THROTTLE_EMAIL_RATE', '5/min'),
+    'signup_ip': os.environ.get('SIGNUP_THROTTLE_IP_RATE', '10/hour'),
+}
 
 
 # Password validation
@@ -157,6 +295,31 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Media is stored once per distinct content; unreferenced blobs are removed
+# by the gc_media management command.
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+
+# Uploaded images are post-processed by a per-process worker pool; set
+# IMAGE_PIPELINE_WORKERS=0 to process them inline after the request commits.
+IMAGE_PIPELINE_WORKERS = int(os.environ.get('IMAGE_PIPELINE_WORKERS', 2))
+IMAGE_RENDITION_WIDTHS = (320, 640, 1280)
+IMAGE_RENDITION_FORMATS = ('webp', 'jpeg')
+UPLOAD_CHUNK_MAX_BYTES = 8 * 1024 * 1024
+# Partial chunked uploads are kept out of MEDIA_ROOT, but on the same volume
+# so completed ones are moved into the media store by a rename. gc_media
+# deletes uploads not written to for UPLOAD_EXPIRY_HOURS.
+UPLOAD_TEMP_DIR = os.environ.get('UPLOAD_TEMP_DIR', '/vol/web/tmp/uploads')
+UPLOAD_EXPIRY_HOURS = int(os.environ.get('UPLOAD_EXPIRY_HOURS', 24))
+RENDITION_CACHE_MAX_BYTES = int(
+    os.environ.get('RENDITION_CACHE_MAX_BYTES', 1024 ** 3)
+)
+
+# Bulk recipe import/export work in batches of this many rows.
+RECIPE_BULK_BATCH_SIZE = 500
+RECIPE_BULK_MAX_ROWS = 100_000
+# Build recipe list pages from values() rows instead of serializers.
+RECIPE_LIST_FAST_PATH = bool(int(os.environ.get('RECIPE_LIST_FAST_PATH', 1)))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -167,10 +330,13 @@ AUTH_USER_MODEL = 'core.User'
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.StatelessJWTAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 50,
+    # nginx passes the client address as REMOTE_ADDR, so X-Forwarded-For
+    # is client supplied unless more proxies are in front of it.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
     
     
 }
@@ -25,10 +25,8 @@ from django.conf import settings
 
 from core import views as core_views
 from  product import  views as product_views
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
+from rest_framework_simplejwt.views import TokenRefreshView
+from user.views import TokenObtainPairView
 
 
 urlpatterns = [
@@ -36,6 +34,9 @@ urlpatterns = [
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('admin/', admin.site.urls),
     path('api/health-check/', core_views.health_check, name='health-check'),
+    path('api/metrics/', core_views.metrics, name='metrics'),
+    path('api/media/renditions/', core_views.rendition, name='rendition'),
+    path('api/media/', include('core.urls')),
     path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
     path(
         'api/docs/',
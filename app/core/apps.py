@@ -1,6 +1,48 @@
-from django.apps import AppConfig
+from django.apps import AppConfig, apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished, request_started
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'core'
\ No newline at end of file
+    name = 'core'
+
+    def ready(self):
+        from rest_framework.authtoken.models import Token
+
+        import core.checks  # noqa: F401 - registers the system checks
+        from core.authentication import invalidate_token, invalidate_user
+        from core.db import (
+            check_connections,
+            record_connection_created,
+            record_connections_used,
+        )
+        from core.metrics import flush_metrics
+        from core.signals import (
+            connect_cache_signals,
+            connect_media_signals,
+            connect_rendition_signals,
+        )
+
+        connect_media_signals(apps.get_models())
+        connect_rendition_signals()
+        connect_cache_signals()
+        connection_created.connect(record_connection_created)
+        # Both run after Django's close_old_connections, which is
+        # connected when django.db is imported.
+        request_started.connect(check_connections)
+        request_finished.connect(record_connections_used)
+        request_finished.connect(flush_metrics)
+
+        User = get_user_model()
+        post_save.connect(invalidate_user, sender=User)
+        post_delete.connect(invalidate_user, sender=User)
+        post_delete.connect(invalidate_token, sender=Token)
+
+        if settings.SLOW_QUERY_LOG_ENABLED:
+            from core.slow_queries import install_slow_query_logger
+
+            connection_created.connect(install_slow_query_logger)
@@ -0,0 +1,189 @@
+"""
+Authentication classes that avoid a user lookup on every request.
+
+CachedTokenAuthentication keeps snapshots of the user behind each API
+token in a bounded, process-local TTL cache. Saving or deleting a user,
+or deleting a token, bumps a per-user generation in the response cache,
+so a password change, deactivation or token revocation invalidates the
+snapshots of every process that reads the generation from the same
+cache. That only holds for a cache shared by all workers, so by default
+snapshots are not used with a per-process one. Snapshots are only used
+for safe methods, so writes always act on a freshly loaded user.
+
+StatelessJWTAuthentication builds the user of a safe request from the
+token claims without touching the database.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from core.cache import bump_generation, get_generation, is_shared_cache
+from core.metrics import registry
+
+
+registry.describe(
+    'auth_token_cache_hits_total', 'counter',
+    'Token authentications served from the user snapshot cache.',
+)
+registry.describe(
+    'auth_token_cache_misses_total', 'counter',
+    'Token authentications that loaded the user from the database.',
+)
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries expire after ttl seconds."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TTLCache(
+    settings.AUTH_TOKEN_CACHE_MAX_ENTRIES,
+    settings.AUTH_TOKEN_CACHE_TTL,
+)
+
+
+def token_cache_enabled():
+    """Return True if token authentication may use cached snapshots.
+
+    AUTH_TOKEN_CACHE_ENABLED = None enables it only when the cache holding
+    the generations is shared.
+    """
+    enabled = settings.AUTH_TOKEN_CACHE_ENABLED
+    if enabled is None:
+        return is_shared_cache(settings.RESPONSE_CACHE_ALIAS)
+    return enabled
+
+
+def _auth_scope(user_id):
+    return f'auth:{user_id}'
+
+
+def _snapshot(user):
+    fields = [field.attname for field in user._meta.concrete_fields]
+    return fields, [getattr(user, field) for field in fields]
+
+
+def _user_from_snapshot(fields, values):
+    # A fresh instance per request, so no state leaks between threads.
+    return get_user_model().from_db(DEFAULT_DB_ALIAS, fields, values)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication serving safe requests from cached users."""
+
+    def authenticate(self, request):
+        self.use_cache = (
+            request.method in SAFE_METHODS and token_cache_enabled()
+        )
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        if not getattr(self, 'use_cache', False):
+            return super().authenticate_credentials(key)
+
+        entry = token_cache.get(key)
+        generation = None
+        if entry is not None:
+            user_id, cached_generation, fields, values = entry
+            generation = get_generation(_auth_scope(user_id))
+            if cached_generation == generation:
+                registry.inc('auth_token_cache_hits_total')
+                user = _user_from_snapshot(fields, values)
+                return user, self.get_model()(key=key, user=user)
+
+        registry.inc('auth_token_cache_misses_total')
+        user, token = super().authenticate_credentials(key)
+        # A snapshot is only trusted with a generation read before the
+        # user was loaded, so a change committed in between is noticed.
+        # The first lookup of a token doesn't know the user yet and is
+        # stored unverified, to be reloaded once more.
+        if entry is None or entry[0] != user.pk:
+            generation = None
+        token_cache.set(key, (user.pk, generation, *_snapshot(user)))
+        return user, token
+
+
+def _bump_user(user_id):
+    scope = _auth_scope(user_id)
+    bump_generation(scope)
+    # Bump again once the change is visible to other transactions.
+    transaction.on_commit(lambda: bump_generation(scope))
+
+
+def invalidate_user(sender, instance, **kwargs):
+    """Drop cached snapshots of a saved or deleted user."""
+    _bump_user(instance.pk)
+
+
+def invalidate_token(sender, instance, **kwargs):
+    """Drop cached snapshots of a deleted token."""
+    _bump_user(instance.user_id)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWT authentication that skips the user lookup for safe requests.
+
+    The user of a GET, HEAD or OPTIONS request is built from the token
+    claims alone, so deactivating a user takes effect on reads only once
+    their access tokens expire. Other requests load the user as usual.
+    """
+
+    def authenticate(self, request):
+        self.stateless = (
+            settings.AUTH_JWT_STATELESS_READS
+            and request.method in SAFE_METHODS
+        )
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if not getattr(self, 'stateless', False):
+            return super().get_user(validated_token)
+        user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+        User = get_user_model()
+        user = User(**{
+            jwt_settings.USER_ID_FIELD: user_id,
+            'is_active': True,
+        })
+        user._state.adding = False
+        user._state.db = DEFAULT_DB_ALIAS
+        return user
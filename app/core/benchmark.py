@@ -0,0 +1,358 @@
+"""
+Benchmarks of the REST API hot paths.
+
+Every scenario is sent through the full Django stack in-process with the
+test client, as the user seeded by the seed_data command. Each request's
+latency and query count are recorded. A second, shorter pass runs under
+tracemalloc to measure allocations without skewing the timings.
+"""
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from collections import Counter
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+
+from core.cache import response_cache_enabled
+from core.models import (
+    Ingredient,
+    Product,
+    Recipe,
+    Tag,
+)
+
+
+class Scenario:
+    """A request repeated by the benchmark.
+
+    path and data may be callables taking the benchmark state and the
+    iteration number. after, if given, is called with the state and the
+    response, e.g. to remember objects created by the request.
+    """
+
+    def __init__(self, name, method, path, data=None, after=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.after = after
+
+    def request(self, client, state, iteration):
+        path = self.path(state, iteration) if callable(self.path) \
+            else self.path
+        data = self.data(state, iteration) if callable(self.data) \
+            else self.data
+        if self.method == 'get':
+            response = client.get(path, data, **state['headers'])
+        else:
+            response = getattr(client, self.method)(
+                path, data, content_type='application/json',
+                **state['headers'],
+            )
+        if self.after is not None:
+            self.after(state, response)
+        return response
+
+
+def _pick(items, iteration):
+    return items[iteration % len(items)]
+
+
+def _recipe_payload(state, iteration):
+    tags = [{'name': name} for name in state['tag_names'][:3]]
+    return {
+        'title': f'Benchmark recipe {iteration}',
+        'time_minutes': 30,
+        'price': '7.50',
+        'tags': tags + [{'name': f'Benchmark tag {iteration}'}],
+        'ingredients': [
+            {'name': name} for name in state['ingredient_names'][:5]
+        ],
+    }
+
+
+def _remember(kind):
+    def after(state, response):
+        if response.status_code == 201:
+            state['created'][kind].append(response.json()['id'])
+    return after
+
+
+def _remember_tokens(state, response):
+    if response.status_code == 200:
+        state['refresh'] = response.json()['refresh']
+
+
+def _pop_product(state, iteration):
+    return reverse(
+        'product:product-detail',
+        args=[state['created']['products'].pop()],
+    )
+
+
+SCENARIOS = [
+    Scenario('recipe-list', 'get', reverse('recipe:recipe-list')),
+    Scenario(
+        'recipe-list-500', 'get', reverse('recipe:recipe-list'),
+        {'limit': 500},
+    ),
+    Scenario(
+        'recipe-list-cursor', 'get', reverse('recipe:recipe-list'),
+        {'pagination': 'cursor'},
+    ),
+    Scenario(
+        'recipe-list-by-tags', 'get', reverse('recipe:recipe-list'),
+        lambda state, i: {
+            'tags': ','.join(str(pk) for pk in state['tag_ids'][:3]),
+        },
+    ),
+    Scenario(
+        'recipe-detail', 'get',
+        lambda state, i: reverse(
+            'recipe:recipe-detail', args=[_pick(state['recipe_ids'], i)],
+        ),
+    ),
+    Scenario(
+        'recipe-create', 'post', reverse('recipe:recipe-list'),
+        _recipe_payload, after=_remember('recipes'),
+    ),
+    Scenario(
+        'recipe-update', 'patch',
+        lambda state, i: reverse(
+            'recipe:recipe-detail',
+            args=[_pick(state['created']['recipes'], i)],
+        ),
+        lambda state, i: {
+            'tags': [{'name': name} for name in state['tag_names'][i % 3:]],
+            'ingredients': [
+                {'name': name}
+                for name in state['ingredient_names'][i % 5:][:5]
+            ],
+        },
+    ),
+    Scenario(
+        'tag-list-assigned', 'get', reverse('recipe:tag-list'),
+        {'assigned_only': 1},
+    ),
+    Scenario(
+        'ingredient-list-assigned', 'get', reverse('recipe:ingredient-list'),
+        {'assigned_only': 1},
+    ),
+    Scenario('product-list', 'get', reverse('product:product-list')),
+    Scenario(
+        'product-create', 'post', reverse('product:product-list'),
+        lambda state, i: {
+            'name': f'Benchmark product {i}',
+            'description': 'Created by the benchmark.',
+            'price': '12.00',
+        },
+        after=_remember('products'),
+    ),
+    Scenario(
+        'product-detail', 'get',
+        lambda state, i: reverse(
+            'product:product-detail',
+            args=[_pick(state['created']['products'], i)],
+        ),
+    ),
+    Scenario(
+        'product-update', 'patch',
+        lambda state, i: reverse(
+            'product:product-detail',
+            args=[_pick(state['created']['products'], i)],
+        ),
+        lambda state, i: {'price': f'{10 + i % 90}.00'},
+    ),
+    Scenario('product-delete', 'delete', _pop_product),
+    Scenario(
+        'token-obtain', 'post', reverse('token_obtain_pair'),
+        lambda state, i: {
+            'email': state['user'].email,
+            'password': state['password'],
+        },
+        after=_remember_tokens,
+    ),
+    Scenario(
+        'token-refresh', 'post', reverse('token_refresh'),
+        lambda state, i: {'refresh': state['refresh']},
+    ),
+]
+
+
+def percentile(values, percent):
+    """Return the percent-th percentile of values (nearest rank)."""
+    ordered = sorted(values)
+    index = max(0, -(-len(ordered) * percent // 100) - 1)
+    return ordered[int(index)]
+
+
+def summarize(latencies, queries, statuses):
+    """Return the statistics of one scenario's timed requests."""
+    return {
+        'requests': len(latencies),
+        'status': {str(code): count for code, count in statuses.items()},
+        'latency_ms': {
+            'mean': round(statistics.mean(latencies), 3),
+            'p50': round(percentile(latencies, 50), 3),
+            'p90': round(percentile(latencies, 90), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(max(latencies), 3),
+        },
+        'queries': {
+            'mean': round(statistics.mean(queries), 2),
+            'max': max(queries),
+        },
+    }
+
+
+def build_state(user, password):
+    """Return the benchmark state for the dataset owned by user."""
+    token, _ = Token.objects.get_or_create(user=user)
+    recipe_ids = list(
+        Recipe.objects.filter(user=user).order_by('-id')
+        .values_list('id', flat=True)[:100]
+    )
+    tags = list(
+        Tag.objects.filter(user=user).order_by('id')
+        .values_list('id', 'name')[:10]
+    )
+    ingredient_names = list(
+        Ingredient.objects.filter(user=user).order_by('id')
+        .values_list('name', flat=True)[:10]
+    )
+    return {
+        'user': user,
+        'password': password,
+        'headers': {'HTTP_AUTHORIZATION': f'Token {token.key}'},
+        'recipe_ids': recipe_ids,
+        'tag_ids': [pk for pk, _ in tags],
+        'tag_names': [name for _, name in tags],
+        'ingredient_names': ingredient_names,
+        'refresh': None,
+        'created': {'recipes': [], 'products': []},
+    }
+
+
+def git_commit():
+    """Return the commit being benchmarked, if known."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            capture_output=True, check=True, text=True, timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def dataset_sizes(user):
+    """Return the row counts the benchmark ran against."""
+    return {
+        'recipes': Recipe.objects.count(),
+        'user_recipes': Recipe.objects.filter(user=user).count(),
+        'tags': Tag.objects.count(),
+        'ingredients': Ingredient.objects.count(),
+        'products': Product.objects.count(),
+    }
+
+
+def run(user, password, scenarios=SCENARIOS, iterations=50, warmup=5,
+        allocation_iterations=5):
+    """Run scenarios as user and return the results as a dict."""
+    client = Client()
+    state = build_state(user, password)
+    results = {}
+    try:
+        for scenario in scenarios:
+            for iteration in range(warmup):
+                scenario.request(client, state, iteration)
+
+            latencies, queries, statuses = [], [], Counter()
+            for iteration in range(warmup, warmup + iterations):
+                with CaptureQueriesContext(connection) as ctx:
+                    started = time.perf_counter()
+                    response = scenario.request(client, state, iteration)
+                    latencies.append(
+                        (time.perf_counter() - started) * 1000
+                    )
+                queries.append(len(ctx.captured_queries))
+                statuses[response.status_code] += 1
+            results[scenario.name] = summarize(latencies, queries, statuses)
+
+            peaks, retained = [], []
+            tracemalloc.start()
+            try:
+                first = warmup + iterations
+                for iteration in range(first, first + allocation_iterations):
+                    before, _ = tracemalloc.get_traced_memory()
+                    tracemalloc.reset_peak()
+                    scenario.request(client, state, iteration)
+                    current, peak = tracemalloc.get_traced_memory()
+                    peaks.append(peak - before)
+                    retained.append(current - before)
+            finally:
+                tracemalloc.stop()
+            if peaks:
+                results[scenario.name]['allocations_kib'] = {
+                    'peak': round(statistics.mean(peaks) / 1024, 1),
+                    'retained': round(statistics.mean(retained) / 1024, 1),
+                }
+    finally:
+        Recipe.objects.filter(pk__in=state['created']['recipes']).delete()
+        Product.objects.filter(pk__in=state['created']['products']).delete()
+        Tag.objects.filter(
+            user=user,
+            name__startswith='Benchmark tag ',
+        ).delete()
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'response_cache': response_cache_enabled(),
+            'recipe_list_fast_path': settings.RECIPE_LIST_FAST_PATH,
+            'iterations': iterations,
+            'warmup': warmup,
+            'dataset': dataset_sizes(user),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Return regressions of current against baseline.
+
+    A scenario regresses when its p50 or p90 latency grows by more than
+    threshold (a fraction), or when it issues more queries on average.
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if before is None:
+            continue
+        for key in ('p50', 'p90'):
+            old = before['latency_ms'][key]
+            new = result['latency_ms'][key]
+            if old and (new - old) / old > threshold:
+                regressions.append(
+                    f'{name}: {key} {old:.2f}ms -> {new:.2f}ms'
+                )
+        old_queries = before['queries']['mean']
+        new_queries = result['queries']['mean']
+        if new_queries > old_queries:
+            regressions.append(
+                f'{name}: queries {old_queries} -> {new_queries}'
+            )
+    return regressions
@@ -0,0 +1,276 @@
+"""
+Response caching and conditional GET support for API views.
+
+Cached responses and ETags are derived from the view, the query parameters
+and a generation counter per scope (a user, or a shared model). Any write
+in the scope bumps the counter, so stale entries are never read again and
+simply age out of the cache. Generations are only trusted when the cache
+holding them is shared by every worker.
+"""
+import calendar
+import functools
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from rest_framework import status
+from rest_framework.response import Response
+
+
+class CacheStats:
+    """Process-local hit/miss counters for the response cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+
+stats = CacheStats()
+
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def is_shared_cache(alias):
+    """Return True if the cache alias is shared by all worker processes.
+
+    A per-process cache only sees the writes, and generation bumps, made
+    by its own worker.
+    """
+    return settings.CACHES[alias]['BACKEND'] not in LOCAL_CACHE_BACKENDS
+
+
+def response_cache_enabled():
+    """Return True if list responses are cached.
+
+    RESPONSE_CACHE_ENABLED = None enables it only with a shared cache.
+    """
+    enabled = settings.RESPONSE_CACHE_ENABLED
+    if enabled is None:
+        return is_shared_cache(settings.RESPONSE_CACHE_ALIAS)
+    return enabled
+
+
+def get_cache():
+    """Return the cache backend used for responses."""
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _generation_key(scope):
+    return f'response-cache:generation:{scope}'
+
+
+def _initial_generation():
+    # Seed from the clock so a counter evicted from the cache never
+    # restarts at a value that older cached responses were stored under.
+    return int(time.time() * 1000)
+
+
+def _pending_scopes(connection):
+    """Return the scopes written but not yet bumped in the transaction."""
+    return connection.__dict__.setdefault('pending_cache_scopes', set())
+
+
+def get_generation(scope):
+    """Return the current cache generation for a user (or other scope)."""
+    connection = transaction.get_connection()
+    pending = _pending_scopes(connection)
+    if scope in pending:
+        # Don't let a transaction read responses cached before its own
+        # writes.
+        pending.discard(scope)
+        bump_generation(scope)
+    cache = get_cache()
+    key = _generation_key(scope)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _initial_generation(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(scope):
+    """Invalidate every cached response of a user (or other scope)."""
+    cache = get_cache()
+    key = _generation_key(scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_generation(), timeout=None)
+
+
+def _bump_committed(scope):
+    _pending_scopes(transaction.get_connection()).discard(scope)
+    bump_generation(scope)
+
+
+def invalidate_scope(scope):
+    """Invalidate the cached responses of scope after a write.
+
+    Outside a transaction the generation is bumped at once. Inside one it
+    is bumped once the transaction commits, however many writes it made,
+    which also drops responses cached by a concurrent request that read
+    the data before the commit. A transaction reading the generation of
+    a scope it wrote to bumps it first.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        bump_generation(scope)
+        return
+    _pending_scopes(connection).add(scope)
+    for entry in connection.run_on_commit:
+        if getattr(entry[1], 'cache_scope', None) == scope:
+            return
+    callback = functools.partial(_bump_committed, scope)
+    callback.cache_scope = scope
+    transaction.on_commit(callback)
+
+
+def _params_digest(request):
+    """Return a digest of the query parameters of request."""
+    params = sorted(
+        (key, sorted(values))
+        for key, values in request.query_params.lists()
+    )
+    return hashlib.sha1(repr(params).encode()).hexdigest()
+
+
+class GenerationScopeMixin:
+    """Key cached data of a view by the cache generation of its scope.
+
+    Generations are bumped by the signals in core.signals on every write
+    to the models behind the view, not by the view itself.
+    """
+
+    def get_cache_scope(self):
+        """Return the generation scope of the view: the requesting user."""
+        return f'user:{self.request.user.pk}'
+
+
+class CachedListMixin(GenerationScopeMixin):
+    """Cache list responses per scope until a write happens in it."""
+
+    def get_response_cache_key(self, request):
+        """Return the cache key for the list response of request."""
+        scope = self.get_cache_scope()
+        generation = get_generation(scope)
+        return (
+            f'response-cache:{scope}:{generation}:'
+            f'{self.basename}:{_params_digest(request)}'
+        )
+
+    def list(self, request, *args, **kwargs):
+        """List objects, serving a cached response when possible."""
+        if not response_cache_enabled():
+            return super().list(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = self.get_response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            stats.hit()
+            return Response(data)
+
+        stats.miss()
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
+
+
+class ConditionalGetMixin(GenerationScopeMixin):
+    """Answer conditional list/retrieve requests with 304 Not Modified.
+
+    With a shared cache the strong ETag is derived from the scope
+    generation, so a matching If-None-Match is answered without touching
+    the queryset or serializer. A per-process generation would miss the
+    writes made through other workers, so without a shared cache the ETag
+    is a digest of the response data instead; that still saves sending
+    the body.
+    """
+
+    def get_etag(self, request):
+        """Return the ETag of the current list/retrieve response."""
+        source = repr((
+            self.basename,
+            self.action,
+            self.kwargs.get(self.lookup_url_kwarg or self.lookup_field),
+            get_generation(self.get_cache_scope()),
+            _params_digest(request),
+            request.accepted_renderer.format,
+        ))
+        return quote_etag(hashlib.sha1(source.encode()).hexdigest())
+
+    def get_data_etag(self, request, data):
+        """Return the ETag of a response with data."""
+        source = json.dumps(
+            [self.basename, request.accepted_renderer.format, data],
+            sort_keys=True,
+            default=str,
+        )
+        return quote_etag(hashlib.sha1(source.encode()).hexdigest())
+
+    def get_last_modified(self, request):
+        """Return when the response last changed, if the model tracks it."""
+        return None
+
+    def _conditional(self, handler, request, *args, **kwargs):
+        """Run handler unless the client's cached copy is still fresh."""
+        last_modified = self.get_last_modified(request)
+        timestamp = None
+        if last_modified is not None:
+            timestamp = calendar.timegm(last_modified.utctimetuple())
+
+        if is_shared_cache(settings.RESPONSE_CACHE_ALIAS):
+            etag = self.get_etag(request)
+            response = get_conditional_response(
+                request,
+                etag=etag,
+                last_modified=timestamp,
+            )
+            if response is None:
+                response = handler(request, *args, **kwargs)
+        else:
+            etag = None
+            response = handler(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                etag = self.get_data_etag(request, response.data)
+                response = get_conditional_response(
+                    request,
+                    etag=etag,
+                    last_modified=timestamp,
+                    response=response,
+                )
+
+        if etag is not None and response.status_code in (
+            status.HTTP_200_OK,
+            status.HTTP_304_NOT_MODIFIED,
+        ):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(super().retrieve, request, *args, **kwargs)
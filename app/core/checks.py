@@ -0,0 +1,105 @@
+"""
+System checks for deployment settings of the core features.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+from core.cache import is_shared_cache
+
+
+# Backends whose add() and incr() read an entry and then write it back.
+NON_ATOMIC_CACHE_BACKENDS = (
+    'django.core.cache.backends.filebased.FileBasedCache',
+)
+
+
+@register(Tags.caches)
+def check_response_cache(app_configs, **kwargs):
+    """Warn when list responses are cached per process."""
+    if settings.RESPONSE_CACHE_ENABLED and \
+            not is_shared_cache(settings.RESPONSE_CACHE_ALIAS):
+        return [Warning(
+            'RESPONSE_CACHE_ENABLED is set with a per-process cache, so '
+            'writes only invalidate the cached responses of one worker.',
+            hint='Set CACHE_BACKEND to a backend shared by all workers.',
+            id='core.W001',
+        )]
+    return []
+
+
+@register(Tags.caches, Tags.security)
+def check_token_cache(app_configs, **kwargs):
+    """Warn when revoked tokens stay cached in other workers."""
+    if settings.AUTH_TOKEN_CACHE_ENABLED and \
+            not is_shared_cache(settings.RESPONSE_CACHE_ALIAS):
+        return [Warning(
+            'AUTH_TOKEN_CACHE_ENABLED is set with a per-process cache, so '
+            'a revoked token keeps authenticating reads in other workers '
+            'until AUTH_TOKEN_CACHE_TTL passes.',
+            hint='Set CACHE_BACKEND to a backend shared by all workers.',
+            id='core.W004',
+        )]
+    return []
+
+
+@register(Tags.security, deploy=True)
+def check_metrics(app_configs, **kwargs):
+    """Warn when the metrics endpoint is disabled or sees one worker."""
+    warnings = []
+    if not settings.METRICS_TOKEN:
+        warnings.append(Warning(
+            'METRICS_TOKEN is not set, so /api/metrics/ is not served '
+            'unless DEBUG is on.',
+            id='core.W002',
+        ))
+    if not settings.METRICS_DIR:
+        warnings.append(Warning(
+            'METRICS_DIR is not set, so /api/metrics/ only reports the '
+            'worker serving the scrape.',
+            id='core.W003',
+        ))
+    return warnings
+
+
+@register(Tags.security, deploy=True)
+def check_login_throttle(app_configs, **kwargs):
+    """Refuse login throttles that count per worker process."""
+    if not settings.LOGIN_THROTTLE_ENABLED:
+        return []
+    if settings.LOGIN_THROTTLE_STORE == 'local':
+        return [Warning(
+            "LOGIN_THROTTLE_STORE is 'local', so every worker counts "
+            'separately and the limits are multiplied by the number of '
+            'workers.',
+            id='core.W005',
+        )]
+    if not is_shared_cache('default'):
+        return [Error(
+            'The login throttles count in a per-process cache, so every '
+            'worker counts separately and the limits are multiplied by '
+            'the number of workers.',
+            hint='Set CACHE_BACKEND to a backend shared by all workers.',
+            id='core.E001',
+        )]
+    if settings.CACHES['default']['BACKEND'] in NON_ATOMIC_CACHE_BACKENDS:
+        return [Error(
+            'The login throttles count in a cache whose add() and incr() '
+            'are not atomic, so parallel logins lose counts.',
+            hint='Use a Redis or memcached CACHE_BACKEND.',
+            id='core.E003',
+        )]
+    return []
+
+
+@register()
+def check_password_pool(app_configs, **kwargs):
+    """Refuse login limits that let logins take every request thread."""
+    if settings.PASSWORD_HASH_MAX_PENDING >= settings.UWSGI_THREADS:
+        return [Error(
+            'PASSWORD_HASH_MAX_PENDING must be lower than UWSGI_THREADS, '
+            'or waiting logins can hold every request thread of a worker.',
+            hint='Leave PASSWORD_HASH_MAX_PENDING unset to use '
+                 'UWSGI_THREADS - 1.',
+            id='core.E002',
+        )]
+    return []
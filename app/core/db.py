@@ -0,0 +1,80 @@
+"""
+Persistent database connection health checks and reuse metrics.
+
+With CONN_MAX_AGE set, each worker thread keeps its connection between
+requests. Django 4.0 has no built-in health check for reused connections,
+so a connection that went away (a database restart, a pooler recycling
+it) would fail the next request. check_connections() runs when a request
+starts and replaces such connections before the view uses them.
+
+Connections still open when a request finishes are known to work, so
+only connections idle for DB_HEALTH_CHECK_INTERVAL seconds cost a round
+trip.
+"""
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from core.metrics import registry
+
+
+registry.describe(
+    'db_connections_created_total', 'counter',
+    'Database connections opened by this process.',
+)
+registry.describe(
+    'db_connections_reused_total', 'counter',
+    'Requests that started on an already open connection.',
+)
+registry.describe(
+    'db_connection_health_check_failures_total', 'counter',
+    'Reused connections found unusable and closed.',
+)
+
+
+def record_connection_created(sender, connection, **kwargs):
+    """Count a newly opened connection."""
+    connection.health_checked_at = time.monotonic()
+    registry.inc('db_connections_created_total', alias=connection.alias)
+
+
+def record_connections_used(**kwargs):
+    """Mark the connections still open after a request as healthy.
+
+    Runs after Django's close_old_connections, which already closed the
+    connections that saw an error and are no longer usable.
+    """
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is not None:
+            connection.health_checked_at = now
+
+
+def check_connections(**kwargs):
+    """Close reused connections that are no longer usable.
+
+    Connections checked or used less than DB_HEALTH_CHECK_INTERVAL
+    seconds ago only get the free check of the driver's closed flag.
+    """
+    now = time.monotonic()
+    interval = settings.DB_HEALTH_CHECK_INTERVAL
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        registry.inc('db_connections_reused_total', alias=connection.alias)
+        if not settings.DB_HEALTH_CHECKS:
+            continue
+        checked_at = getattr(connection, 'health_checked_at', None)
+        closed = getattr(connection.connection, 'closed', False)
+        if not closed and checked_at is not None and \
+                now - checked_at < interval:
+            continue
+        if closed or not connection.is_usable():
+            registry.inc(
+                'db_connection_health_check_failures_total',
+                alias=connection.alias,
+            )
+            connection.close()
+        else:
+            connection.health_checked_at = now
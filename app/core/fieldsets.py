@@ -0,0 +1,164 @@
+"""
+Sparse fieldsets for API responses.
+
+Read requests may prune the fields of a response:
+
+    ?fields=id,title,price   only these fields
+    ?omit=description        every field but these
+    ?expand=tags             nest these relations in full, list the
+                             primary keys of the other expandable ones;
+                             an empty ?expand= lists keys only
+
+Without the parameters responses are unchanged. Serializers opt in with
+SparseFieldsetMixin and list their expandable relations in
+Meta.expandable_fields. Views using SparseQuerysetMixin fetch only the
+columns and relations the pruned serializer reads.
+"""
+from collections import namedtuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+
+from drf_spectacular.utils import OpenApiParameter, OpenApiTypes
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+FIELDSET_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='Comma separated list of the fields to return.',
+    ),
+    OpenApiParameter(
+        'omit',
+        OpenApiTypes.STR,
+        description='Comma separated list of fields to leave out.',
+    ),
+    OpenApiParameter(
+        'expand',
+        OpenApiTypes.STR,
+        description=(
+            'Comma separated list of relations to nest in full; other '
+            'relations are returned as lists of IDs.'
+        ),
+    ),
+]
+
+Fieldset = namedtuple('Fieldset', ['fields', 'omit', 'expand'])
+
+
+def _names(params, key):
+    if key not in params:
+        return None
+    return {name.strip() for name in params[key].split(',') if name.strip()}
+
+
+def get_fieldset(request):
+    """Return the Fieldset requested by a read request, or None."""
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    params = request.query_params
+    fieldset = Fieldset(
+        _names(params, 'fields'),
+        _names(params, 'omit'),
+        _names(params, 'expand'),
+    )
+    if fieldset == Fieldset(None, None, None):
+        return None
+    return fieldset
+
+
+class SparseFieldsetMixin:
+    """Prune the fields of the outermost serializer of a read request."""
+
+    def _is_root(self):
+        root = self.root
+        return root is self or (
+            isinstance(root, serializers.ListSerializer)
+            and root.child is self
+        )
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = get_fieldset(self.context.get('request'))
+        if fieldset is None or not self._is_root():
+            return fields
+
+        for name in list(fields):
+            if fieldset.fields is not None and name not in fieldset.fields:
+                del fields[name]
+            elif fieldset.omit and name in fieldset.omit:
+                del fields[name]
+
+        if fieldset.expand is not None:
+            expandable = getattr(self.Meta, 'expandable_fields', ())
+            for name in expandable:
+                if name in fields and name not in fieldset.expand:
+                    fields[name] = serializers.PrimaryKeyRelatedField(
+                        many=isinstance(
+                            fields[name], serializers.ListSerializer,
+                        ),
+                        read_only=True,
+                    )
+        return fields
+
+
+class SparseQuerysetMixin:
+    """Fetch only what the pruned serializer of a read request reads."""
+
+    def get_fieldset_plan(self):
+        """Return (columns, relations) read by the response, or None.
+
+        columns is None if some field reads something other than model
+        fields; relations maps relation names to whether they are nested.
+        """
+        if get_fieldset(self.request) is None:
+            return None
+        serializer = self.get_serializer()
+        model = self.queryset.model
+        sources = getattr(serializer.Meta, 'fieldset_sources', {})
+        columns, relations = {model._meta.pk.name}, {}
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            for source in sources.get(name, [field.source]):
+                try:
+                    model_field = model._meta.get_field(source.split('.')[0])
+                except FieldDoesNotExist:
+                    columns = None
+                    continue
+                if model_field.many_to_many or model_field.one_to_many:
+                    relations[model_field.name] = isinstance(
+                        field, serializers.BaseSerializer,
+                    )
+                elif columns is not None:
+                    columns.add(model_field.name)
+        return columns, relations
+
+    def prune_queryset(self, queryset, prefetch=None):
+        """Return queryset limited to the requested fields.
+
+        prefetch maps relation names to the querysets prefetching them in
+        full; relations that are not returned are not prefetched, and
+        relations returned as IDs only fetch primary keys.
+        """
+        prefetch = prefetch or {}
+        plan = self.get_fieldset_plan()
+        if plan is None:
+            return queryset.prefetch_related(*(
+                Prefetch(name, queryset=related)
+                for name, related in prefetch.items()
+            ))
+
+        columns, relations = plan
+        if columns is not None:
+            queryset = queryset.only(*columns)
+        lookups = []
+        for name, related in prefetch.items():
+            if name not in relations:
+                continue
+            if not relations[name]:
+                related = related.only(related.model._meta.pk.name)
+            lookups.append(Prefetch(name, queryset=related))
+        return queryset.prefetch_related(*lookups)
@@ -0,0 +1,231 @@
+"""
+Background processing of uploaded images.
+
+Uploads are stored as-is by the request, and an ImageJob row is queued.
+A small in-process worker pool then verifies the image, replaces the
+stored original with a copy without metadata and renders resized
+renditions, so the request never decodes or resizes images itself.
+"""
+import io
+import logging
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import connection, transaction
+
+from core.models import ImageJob, Recipe
+
+
+logger = logging.getLogger(__name__)
+
+# Renditions are derived data, kept outside the default storage.
+rendition_storage = FileSystemStorage()
+
+PILLOW_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Return the worker pool, creating it on first use in this process."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_PIPELINE_WORKERS,
+                thread_name_prefix='image-pipeline',
+            )
+    return _executor
+
+
+def job_rendition_dir(job_id):
+    """Return the directory holding the renditions of an image job."""
+    return f'uploads/recipe/renditions/{job_id}'
+
+
+def delete_job_renditions(job_id):
+    """Delete the rendition files of an image job."""
+    shutil.rmtree(
+        rendition_storage.path(job_rendition_dir(job_id)),
+        ignore_errors=True,
+    )
+
+
+def completed_renditions(recipe):
+    """Return the rendition specs of the current image of recipe.
+
+    Empty until the image job of the image has completed.
+    """
+    if not recipe.image:
+        return []
+    job = recipe.image_jobs.filter(
+        status=ImageJob.Status.DONE,
+        source=recipe.image.name,
+    ).order_by('-pk').only('renditions').first()
+    return job.renditions if job else []
+
+
+def can_encode(fmt):
+    """Return whether this Pillow build can write images as fmt."""
+    Image.init()
+    return PILLOW_FORMATS.get(fmt) in Image.SAVE
+
+
+def open_verified_image(name, storage=default_storage):
+    """Open the image stored at name after checking it with Pillow.
+
+    The EXIF orientation is applied and all metadata but the colour
+    profile is dropped from the returned image.
+    """
+    with storage.open(name) as image_file:
+        Image.open(image_file).verify()
+    with storage.open(name) as image_file:
+        image = Image.open(image_file)
+        image.load()
+    fmt = image.format
+    # Apply the EXIF orientation before the metadata is dropped.
+    image = ImageOps.exif_transpose(image)
+    image.info = {
+        key: value for key, value in image.info.items()
+        if key == 'icc_profile'
+    }
+    image.format = fmt
+    return image
+
+
+def strip_original(job, image):
+    """Replace the stored upload of job with image, without metadata.
+
+    Uploads are stored as sent, EXIF data such as GPS coordinates
+    included. Returns the name of the stripped copy, or job.source if the
+    recipe image was replaced in the meantime.
+    """
+    buffer = io.BytesIO()
+    params = {}
+    if 'icc_profile' in image.info:
+        params['icc_profile'] = image.info['icc_profile']
+    if image.format == 'JPEG':
+        params['quality'] = 95
+    image.save(buffer, format=image.format or 'PNG', **params)
+    name = default_storage.save(job.source, ContentFile(buffer.getvalue()))
+
+    if name != job.source:
+        with transaction.atomic():
+            recipe = Recipe.objects.select_for_update().get(
+                pk=job.recipe_id,
+            )
+            if recipe.image.name == job.source:
+                # The signals release the original once this commits.
+                recipe.image.name = name
+                recipe.save(update_fields=['image'])
+                return name
+    # Drop the reference save() took on the unused copy.
+    release = getattr(default_storage, 'release', None)
+    if release is not None:
+        release(name)
+    return job.source
+
+
+def render_image(image, width, fmt):
+    """Return image scaled to width and encoded as fmt, without metadata."""
+    if width < image.width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.Resampling.LANCZOS)
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+
+    buffer = io.BytesIO()
+    # No exif/icc_profile arguments are passed, so none are written.
+    image.save(buffer, format=PILLOW_FORMATS[fmt], quality=85)
+    return image.size, buffer.getvalue()
+
+
+def create_renditions(job, image):
+    """Render every configured rendition of image for job.
+
+    Formats this Pillow build cannot write are skipped with a warning.
+    Returns the specs of the renditions.
+    """
+    formats = []
+    for fmt in settings.IMAGE_RENDITION_FORMATS:
+        if can_encode(fmt):
+            formats.append(fmt)
+        else:
+            logger.warning('Skipping %s renditions: not supported.', fmt)
+    widths = sorted(
+        {min(width, image.width) for width in settings.IMAGE_RENDITION_WIDTHS}
+    )
+    renditions = []
+    for width in widths:
+        for fmt in formats:
+            (width, height), content = render_image(image, width, fmt)
+            name = rendition_storage.save(
+                f'{job_rendition_dir(job.pk)}/{width}.{fmt}',
+                ContentFile(content),
+            )
+            renditions.append({
+                'name': name,
+                'width': width,
+                'height': height,
+                'format': fmt,
+            })
+    return renditions
+
+
+def process_image_job(job_id):
+    """Claim and run a pending image job."""
+    claimed = ImageJob.objects.filter(
+        pk=job_id,
+        status=ImageJob.Status.PENDING,
+    ).update(status=ImageJob.Status.PROCESSING)
+    if not claimed:
+        return
+
+    job = ImageJob.objects.select_related('recipe').get(pk=job_id)
+    try:
+        image = open_verified_image(job.source)
+        job.source = strip_original(job, image)
+        job.renditions = create_renditions(job, image)
+        job.status = ImageJob.Status.DONE
+    except Exception as exc:
+        logger.exception('Image job %s failed.', job_id)
+        job.status = ImageJob.Status.FAILED
+        job.error = str(exc)
+    job.save(update_fields=[
+        'source', 'renditions', 'status', 'error', 'updated_at',
+    ])
+
+
+def _run_in_worker(job_id):
+    try:
+        process_image_job(job_id)
+    except Exception:
+        logger.exception('Image job %s could not be run.', job_id)
+    finally:
+        # Worker threads own their connection; don't leak it.
+        connection.close()
+
+
+def enqueue_image_job(job):
+    """Run job on the worker pool once the current transaction commits.
+
+    With IMAGE_PIPELINE_WORKERS set to 0 the job runs inline instead.
+    """
+    if settings.IMAGE_PIPELINE_WORKERS == 0:
+        transaction.on_commit(lambda: process_image_job(job.pk))
+    else:
+        transaction.on_commit(
+            lambda: _get_executor().submit(_run_in_worker, job.pk)
+        )
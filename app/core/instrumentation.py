@@ -0,0 +1,211 @@
+"""
+Per-request query, serializer and timing instrumentation.
+
+InstrumentationMiddleware wraps query execution on every database
+connection for the duration of a request. It counts queries and their
+time, notices when the same SQL shape runs over and over (an N+1
+pattern), and adds a Server-Timing header. Per view and action totals are
+aggregated in core.metrics and served by the metrics view.
+"""
+import contextvars
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from core.cache import stats as cache_stats
+from core.metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('instrumentation_request', default=None)
+_serializer_depth = contextvars.ContextVar('serializer_depth', default=0)
+
+registry.describe(
+    'http_requests_total', 'counter', 'Requests by view, action and status.',
+)
+registry.describe(
+    'http_request_duration_seconds', 'histogram',
+    'Time spent handling requests.',
+)
+registry.describe(
+    'http_response_size_bytes', 'histogram', 'Size of response bodies.',
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576),
+)
+registry.describe(
+    'db_queries_per_request', 'histogram', 'Queries run per request.',
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100),
+)
+registry.describe(
+    'db_query_duration_seconds_total', 'counter',
+    'Time spent running queries.',
+)
+registry.describe(
+    'serializer_duration_seconds_total', 'counter',
+    'Time spent in serializers.',
+)
+registry.describe(
+    'db_n_plus_one_total', 'counter',
+    'Requests running one SQL shape at least the N+1 threshold of times.',
+)
+registry.describe(
+    'response_cache_hits_total', 'counter', 'Response cache hits.',
+)
+registry.describe(
+    'response_cache_misses_total', 'counter', 'Response cache misses.',
+)
+
+
+def _collect_cache_stats(registry):
+    registry.set('response_cache_hits_total', cache_stats.hits)
+    registry.set('response_cache_misses_total', cache_stats.misses)
+
+
+registry.register_collector(_collect_cache_stats)
+
+
+class RequestMetrics:
+    """Work done while handling one request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        """Time a query; installed with connection.execute_wrapper()."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            # Parameters are passed separately, so the SQL is its shape.
+            self.shapes[sql] += 1
+
+    def repeated_shapes(self, threshold):
+        """Return (sql, count) of shapes run at least threshold times."""
+        return [
+            (sql, count) for sql, count in self.shapes.items()
+            if count >= threshold
+        ]
+
+
+def current_request_metrics():
+    """Return the metrics of the request being handled, if instrumented."""
+    return _current.get()
+
+
+class TimedSerializerMixin:
+    """Add the time a serializer spends to the current request's metrics.
+
+    Only the outermost serializer is timed, so nested serializers are not
+    counted twice.
+    """
+
+    def _timed(self, method, *args):
+        metrics = _current.get()
+        depth = _serializer_depth.get()
+        if metrics is None or depth:
+            return method(*args)
+        token = _serializer_depth.set(depth + 1)
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            metrics.serializer_time += time.perf_counter() - started
+            _serializer_depth.reset(token)
+
+    def to_representation(self, instance):
+        return self._timed(super().to_representation, instance)
+
+    def run_validation(self, *args):
+        return self._timed(super().run_validation, *args)
+
+
+def view_labels(request):
+    """Return the view and action labels of request."""
+    match = request.resolver_match
+    if match is None:
+        return 'unresolved', request.method.lower()
+    method = request.method.lower()
+    actions = getattr(match.func, 'actions', None) or {}
+    return match.view_name, actions.get(method, method)
+
+
+def _server_timing(metrics, total, repeated):
+    parts = [
+        f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} '
+        f'queries"',
+        f'serializer;dur={metrics.serializer_time * 1000:.1f}',
+        f'total;dur={total * 1000:.1f}',
+    ]
+    if repeated:
+        parts.append(f'nplusone;desc="{len(repeated)} repeated queries"')
+    return ', '.join(parts)
+
+
+class InstrumentationMiddleware:
+    """Record queries, serializer time and response size per request."""
+
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTATION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - started
+
+        threshold = settings.INSTRUMENTATION_N_PLUS_ONE_THRESHOLD
+        repeated = metrics.repeated_shapes(threshold)
+        view, action = view_labels(request)
+        self.record(view, action, response, metrics, total, repeated)
+        if repeated:
+            for sql, count in repeated:
+                logger.warning(
+                    'Possible N+1 in %s (%s): query ran %d times: %s',
+                    view, action, count, sql[:500],
+                )
+        if settings.INSTRUMENTATION_SERVER_TIMING:
+            response['Server-Timing'] = _server_timing(
+                metrics, total, repeated,
+            )
+        return response
+
+    def record(self, view, action, response, metrics, total, repeated):
+        """Add the request to the aggregated metrics."""
+        labels = {'view': view, 'action': action}
+        registry.inc(
+            'http_requests_total', status=response.status_code, **labels,
+        )
+        registry.observe('http_request_duration_seconds', total, **labels)
+        registry.observe('db_queries_per_request', metrics.queries, **labels)
+        registry.inc(
+            'db_query_duration_seconds_total', metrics.db_time, **labels,
+        )
+        registry.inc(
+            'serializer_duration_seconds_total', metrics.serializer_time,
+            **labels,
+        )
+        if not response.streaming:
+            registry.observe(
+                'http_response_size_bytes', len(response.content), **labels,
+            )
+        if repeated:
+            registry.inc('db_n_plus_one_total', **labels)
@@ -0,0 +1,133 @@
+"""
+Django command to benchmark the API hot paths.
+"""
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from core import benchmark
+
+
+class Command(BaseCommand):
+    """Django command to record API latency, queries and allocations.
+
+    Run it against data created by seed_data. The results are written as
+    JSON, and --compare fails the command when a scenario regressed
+    against an earlier result file.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--email',
+            default='seed-user-0@example.com',
+            help='User whose data the requests read and write.',
+        )
+        parser.add_argument('--password', default='seedpass123')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--allocation-iterations',
+            type=int,
+            default=5,
+            help='Requests per scenario traced for allocations.',
+        )
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=[scenario.name for scenario in benchmark.SCENARIOS],
+            help=(
+                'Only run this scenario; may be repeated. Update, detail '
+                'and delete scenarios need their create scenario too.'
+            ),
+        )
+        parser.add_argument(
+            '--no-response-cache',
+            action='store_true',
+            help='Disable the list response cache while benchmarking.',
+        )
+        parser.add_argument(
+            '--no-fast-path',
+            action='store_true',
+            help='Serialize recipe lists with RecipeSerializer instead.',
+        )
+        parser.add_argument(
+            '--output',
+            help='Write the results to this file instead of stdout.',
+        )
+        parser.add_argument(
+            '--compare',
+            help='Results file of an earlier run to compare against.',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.1,
+            help='Latency growth, as a fraction, counted as a regression.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be positive.')
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(
+                f"No user {options['email']}; run seed_data first."
+            )
+        if not user.recipe_set.exists():
+            raise CommandError(f'{user.email} has no recipes to read.')
+
+        scenarios = benchmark.SCENARIOS
+        if options['scenario']:
+            scenarios = [
+                scenario for scenario in scenarios
+                if scenario.name in options['scenario']
+            ]
+        overrides = {
+            'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+            # Repeated logins would measure the throttle, not the view.
+            'LOGIN_THROTTLE_ENABLED': False,
+        }
+        if options['no_response_cache']:
+            overrides['RESPONSE_CACHE_ENABLED'] = False
+        if options['no_fast_path']:
+            overrides['RECIPE_LIST_FAST_PATH'] = False
+        with override_settings(**overrides):
+            results = benchmark.run(
+                user,
+                options['password'],
+                scenarios=scenarios,
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+                allocation_iterations=options['allocation_iterations'],
+            )
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+            for name, result in results['results'].items():
+                latency = result['latency_ms']
+                self.stdout.write(
+                    f"{name:<26} p50 {latency['p50']:>8.2f}ms  "
+                    f"p90 {latency['p90']:>8.2f}ms  "
+                    f"queries {result['queries']['mean']:>6}"
+                )
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                baseline = json.load(baseline_file)
+            regressions = benchmark.compare(
+                baseline, results, options['threshold'],
+            )
+            if regressions:
+                raise CommandError(
+                    'Regressions found:\n' + '\n'.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('No regressions found.'))
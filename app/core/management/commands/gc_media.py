@@ -0,0 +1,197 @@
+"""
+Django command to remove media blobs that are no longer referenced.
+"""
+import os
+from collections import Counter
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.utils import timezone
+
+from core.models import ChunkedUpload, MediaBlob
+from core.renditions import evict
+from core.storage import BLOB_DIR, is_blob
+
+
+def count_references():
+    """Return how many file fields reference each blob."""
+    counts = Counter()
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if not isinstance(field, models.FileField):
+                continue
+            names = model._base_manager.filter(
+                **{f'{field.attname}__startswith': f'{BLOB_DIR}/'},
+            ).values_list(field.attname, flat=True)
+            counts.update(names.iterator())
+    return counts
+
+
+class Command(BaseCommand):
+    """Django command to garbage collect content-addressed media.
+
+    Blobs whose reference count dropped to zero more than the grace period
+    ago are deleted, as are files in the blob store without a row. Chunked
+    uploads left unfinished are deleted with their partial files, and the
+    on-demand rendition cache is trimmed to RENDITION_CACHE_MAX_BYTES.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-minutes',
+            type=int,
+            default=60,
+            help='Keep unreferenced blobs released more recently than this.',
+        )
+        parser.add_argument(
+            '--upload-expiry-hours',
+            type=int,
+            default=settings.UPLOAD_EXPIRY_HOURS,
+            help='Delete unfinished uploads not written to for this long.',
+        )
+        parser.add_argument(
+            '--rendition-cache-bytes',
+            type=int,
+            default=settings.RENDITION_CACHE_MAX_BYTES,
+            help='Trim the on-demand rendition cache to this size.',
+        )
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Rebuild reference counts from the file fields first.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be removed without removing it.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        dry_run = options['dry_run']
+        if options['recount']:
+            self.recount(dry_run)
+
+        cutoff = timezone.now() - timedelta(minutes=options['grace_minutes'])
+        removed = 0
+        reclaimed = 0
+        candidates = MediaBlob.objects.filter(
+            refcount=0,
+            updated_at__lt=cutoff,
+        ).values_list('pk', flat=True)
+        for pk in list(candidates):
+            with transaction.atomic():
+                # Re-check under the row lock: adopt() may have taken a new
+                # reference since the candidates were listed.
+                blob = MediaBlob.objects.select_for_update().filter(
+                    pk=pk,
+                    refcount=0,
+                ).first()
+                if blob is None:
+                    continue
+                removed += 1
+                reclaimed += blob.size
+                if not dry_run:
+                    blob.delete()
+                    default_storage.delete_blob(blob.name)
+
+        orphans, orphan_bytes = self.sweep_orphans(cutoff, dry_run)
+        expired, expired_bytes = self.expire_uploads(
+            timezone.now() - timedelta(hours=options['upload_expiry_hours']),
+            dry_run,
+        )
+        verb = 'Would remove' if dry_run else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {removed + orphans} blobs, '
+            f'{reclaimed + orphan_bytes} bytes.'
+        ))
+        self.stdout.write(
+            f'{verb} {expired} unfinished uploads, {expired_bytes} bytes.'
+        )
+        if not dry_run:
+            freed = evict(options['rendition_cache_bytes'])
+            self.stdout.write(f'Evicted {freed} bytes of renditions.')
+
+    def recount(self, dry_run):
+        """Correct reference counts that drifted from the file fields."""
+        counts = count_references()
+        fixed = 0
+        for blob in MediaBlob.objects.iterator():
+            refcount = counts.get(blob.name, 0)
+            if blob.refcount != refcount:
+                fixed += 1
+                if not dry_run:
+                    MediaBlob.objects.filter(pk=blob.pk).update(
+                        refcount=refcount,
+                        updated_at=timezone.now(),
+                    )
+        self.stdout.write(f'Corrected {fixed} reference counts.')
+
+    def sweep_orphans(self, cutoff, dry_run):
+        """Remove blob files that have no row, e.g. after a failed save."""
+        root = default_storage.path(BLOB_DIR)
+        cutoff_ts = cutoff.timestamp()
+        orphans = 0
+        reclaimed = 0
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, default_storage.location)
+                name = name.replace(os.sep, '/')
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                # Recent files may belong to a save still in progress.
+                if stat.st_mtime >= cutoff_ts:
+                    continue
+                if is_blob(name) and \
+                        MediaBlob.objects.filter(name=name).exists():
+                    continue
+                orphans += 1
+                reclaimed += stat.st_size
+                if not dry_run:
+                    os.remove(path)
+        return orphans, reclaimed
+
+    def expire_uploads(self, cutoff, dry_run):
+        """Remove uploads and partial files not written to since cutoff."""
+        expired = 0
+        stale = ChunkedUpload.objects.filter(
+            status=ChunkedUpload.Status.UPLOADING,
+            updated_at__lt=cutoff,
+        ).values_list('pk', flat=True)
+        for pk in list(stale):
+            with transaction.atomic():
+                # Skip uploads a request is writing to right now.
+                upload = ChunkedUpload.objects.select_for_update(
+                    skip_locked=True,
+                ).filter(pk=pk, updated_at__lt=cutoff).first()
+                if upload is None:
+                    continue
+                expired += 1
+                if not dry_run:
+                    upload.delete()
+
+        # Every chunk touches the partial file, so an old one belongs to an
+        # upload that was abandoned, expired above or failed to complete.
+        reclaimed = 0
+        root = settings.UPLOAD_TEMP_DIR
+        if not os.path.isdir(root):
+            return expired, reclaimed
+        cutoff_ts = cutoff.timestamp()
+        for entry in os.scandir(root):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime >= cutoff_ts:
+                continue
+            reclaimed += stat.st_size
+            if not dry_run:
+                os.remove(entry.path)
+        return expired, reclaimed
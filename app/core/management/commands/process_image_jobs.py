@@ -0,0 +1,49 @@
+"""
+Django command to run pending image jobs.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.images import process_image_job
+from core.models import ImageJob
+
+
+class Command(BaseCommand):
+    """Django command to drain the image job table.
+
+    Jobs are normally run by the in-process worker pool. This picks up
+    jobs left pending (or stuck processing) by a worker that went away.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-minutes',
+            type=int,
+            default=15,
+            help='Requeue jobs processing for longer than this.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        stale_before = timezone.now() - timedelta(
+            minutes=options['stale_minutes'],
+        )
+        requeued = ImageJob.objects.filter(
+            status=ImageJob.Status.PROCESSING,
+            updated_at__lt=stale_before,
+        ).update(status=ImageJob.Status.PENDING)
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} stale image jobs.')
+
+        job_ids = ImageJob.objects.filter(
+            status=ImageJob.Status.PENDING,
+        ).order_by('id').values_list('id', flat=True)
+        processed = 0
+        for job_id in list(job_ids):
+            process_image_job(job_id)
+            processed += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Processed {processed} image jobs.')
+        )
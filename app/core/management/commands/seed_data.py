@@ -0,0 +1,191 @@
+"""
+Django command to fill the database with synthetic load-testing data.
+"""
+import multiprocessing
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core import seeding
+from core.cache import bump_generation
+from core.models import Ingredient, Recipe, Tag
+
+
+class Command(BaseCommand):
+    """Django command to seed users, recipes, products and books.
+
+    The same options always produce the same data. Seed users log in as
+    seed-user-<n>@example.com with --password.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument(
+            '--tags-per-user',
+            type=int,
+            default=50,
+            help='Distinct tags created for every user.',
+        )
+        parser.add_argument(
+            '--ingredients-per-user',
+            type=int,
+            default=200,
+            help='Distinct ingredients created for every user.',
+        )
+        parser.add_argument(
+            '--tags-per-recipe',
+            type=int,
+            default=3,
+            help='Mean number of tags linked to a recipe.',
+        )
+        parser.add_argument(
+            '--ingredients-per-recipe',
+            type=int,
+            default=8,
+            help='Mean number of ingredients linked to a recipe.',
+        )
+        parser.add_argument('--products', type=int, default=0)
+        parser.add_argument('--books', type=int, default=0)
+        parser.add_argument(
+            '--sections-per-book',
+            type=int,
+            default=10,
+        )
+        parser.add_argument(
+            '--languages',
+            default='en,sw,fr',
+            help='Comma separated languages of every book and section.',
+        )
+        parser.add_argument(
+            '--distribution',
+            choices=seeding.DISTRIBUTIONS,
+            default='zipf',
+            help='How recipes spread over users, tags and ingredients.',
+        )
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.1,
+            help='Exponent of the zipf distribution.',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10_000,
+            help='Rows per shard; each shard is written in one transaction.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Worker processes writing shards in parallel.',
+        )
+        parser.add_argument('--password', default='seedpass123')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['users'] < 1:
+            raise CommandError('At least one user is required.')
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--batch-size and --workers must be positive.')
+        started = time.monotonic()
+
+        user_ids = seeding.seed_users(options['users'], options['password'])
+        self.stdout.write(f'Seeded {len(user_ids)} users.')
+        tag_ids = seeding.seed_named(
+            Tag, user_ids, options['tags_per_user'],
+        )
+        ingredient_ids = seeding.seed_named(
+            Ingredient, user_ids, options['ingredients_per_user'],
+        )
+        self.stdout.write(
+            f"Seeded {options['tags_per_user']} tags and "
+            f"{options['ingredients_per_user']} ingredients per user."
+        )
+
+        distribution = options['distribution']
+        skew = options['skew']
+        plan = {
+            'seed': options['seed'],
+            'shard_size': options['batch_size'],
+            'recipes': options['recipes'],
+            'products': options['products'],
+            'sections_per_book': options['sections_per_book'],
+            'user_ids': user_ids,
+            'user_weights': seeding.cumulative_weights(
+                len(user_ids), distribution, skew,
+            ),
+            'tag_ids': tag_ids,
+            'tag_weights': seeding.cumulative_weights(
+                options['tags_per_user'], distribution, skew,
+            ),
+            'ingredient_ids': ingredient_ids,
+            'ingredient_weights': seeding.cumulative_weights(
+                options['ingredients_per_user'], distribution, skew,
+            ),
+            'tags_per_recipe': options['tags_per_recipe'],
+            'ingredients_per_recipe': options['ingredients_per_recipe'],
+        }
+        if options['recipes']:
+            plan['first_recipe_id'] = seeding.reserve_ids(
+                Recipe, options['recipes'],
+            )
+        tasks = [
+            (kind, shard)
+            for kind in ('recipes', 'products')
+            for shard in range(-(-plan[kind] // plan['shard_size']))
+        ]
+        written = self.run_tasks(plan, tasks, options['workers'])
+        self.stdout.write(
+            f"Seeded {written['recipes']} recipes and "
+            f"{written['products']} products."
+        )
+
+        if options['books']:
+            languages = [
+                language.strip()
+                for language in options['languages'].split(',')
+                if language.strip()
+            ]
+            rows = seeding.seed_books(plan, options['books'], languages)
+            if rows is None:
+                self.stdout.write(self.style.WARNING(
+                    'Skipped books: the book app is not installed.'
+                ))
+            else:
+                self.stdout.write(f'Seeded {rows} book rows.')
+
+        # Rows are written without model signals, so invalidate here.
+        for user_id in user_ids:
+            bump_generation(f'user:{user_id}')
+        bump_generation('product')
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeding finished in {time.monotonic() - started:.1f}s.'
+        ))
+
+    def run_tasks(self, plan, tasks, workers):
+        """Run the shard tasks, in worker processes if more than one."""
+        if workers == 1 or len(tasks) <= 1:
+            seeding.init_worker(plan)
+            return self.collect(tasks, map(seeding.run_shard, tasks))
+
+        # Forked workers must not share the parent's connections.
+        connections.close_all()
+        with multiprocessing.Pool(
+            workers,
+            initializer=seeding.init_worker,
+            initargs=(plan,),
+        ) as pool:
+            return self.collect(tasks, pool.imap(seeding.run_shard, tasks))
+
+    def collect(self, tasks, results):
+        """Report progress as shards finish, return rows written by kind."""
+        written = {'recipes': 0, 'products': 0}
+        for (kind, _), count in zip(tasks, results):
+            written[kind] += count
+            self.stdout.write(f'  {kind}: {written[kind]}')
+        return written
@@ -0,0 +1,94 @@
+"""
+Django command to summarize the slow query log.
+"""
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.slow_queries import read_entries
+
+
+def aggregate(entries):
+    """Return per-fingerprint aggregates of slow query log entries."""
+    stats = {}
+    for entry in entries:
+        item = stats.get(entry['fingerprint'])
+        if item is None:
+            item = stats[entry['fingerprint']] = {
+                'fingerprint': entry['fingerprint'],
+                'sql': entry['sql'],
+                'calls': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'views': Counter(),
+                'last_seen': None,
+                'explain': None,
+            }
+        item['calls'] += 1
+        item['total_ms'] += entry['duration_ms']
+        item['max_ms'] = max(item['max_ms'], entry['duration_ms'])
+        item['views'][entry.get('view') or '-'] += 1
+        # Entries of different processes' logs are not in time order.
+        item['last_seen'] = max(item['last_seen'] or '', entry['time'])
+        if entry.get('explain'):
+            item['explain'] = entry['explain']
+
+    for item in stats.values():
+        item['mean_ms'] = round(item['total_ms'] / item['calls'], 3)
+        item['total_ms'] = round(item['total_ms'], 3)
+        item['views'] = dict(item['views'].most_common())
+    return sorted(stats.values(), key=lambda item: -item['total_ms'])
+
+
+class Command(BaseCommand):
+    """Django command to list the slowest statement shapes."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log-file',
+            default=None,
+            help='Slow query log to read; defaults to SLOW_QUERY_LOG_FILE.',
+        )
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the aggregates as JSON.',
+        )
+        parser.add_argument(
+            '--explain',
+            metavar='FINGERPRINT',
+            help='Print the latest captured plan of one fingerprint.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        path = options['log_file'] or settings.SLOW_QUERY_LOG_FILE
+        stats = aggregate(read_entries(path))
+
+        if options['explain']:
+            for item in stats:
+                if item['fingerprint'] == options['explain']:
+                    if not item['explain']:
+                        raise CommandError('No plan was captured.')
+                    self.stdout.write(item['sql'])
+                    self.stdout.write(item['explain'])
+                    return
+            raise CommandError(f"Unknown fingerprint {options['explain']}.")
+
+        stats = stats[:options['limit']]
+        if options['json']:
+            self.stdout.write(json.dumps(stats, indent=2))
+            return
+
+        for item in stats:
+            top_view = next(iter(item['views']))
+            self.stdout.write(
+                f"{item['fingerprint']}  calls {item['calls']:>6}  "
+                f"total {item['total_ms']:>10.1f}ms  "
+                f"mean {item['mean_ms']:>8.1f}ms  "
+                f"max {item['max_ms']:>8.1f}ms  {top_view}"
+            )
+            self.stdout.write(f"    {item['sql'][:200]}")
@@ -0,0 +1,249 @@
+"""
+Metrics rendered in the Prometheus text format.
+
+Each worker process keeps its own counters, gauges and histograms. A
+scrape reaches one worker only, so with METRICS_DIR set every process
+also writes its values to a file of its own there, at most every
+METRICS_FLUSH_INTERVAL seconds and when it renders, and renders the sum
+of every file. Files of exited workers are kept so counters don't go
+back; the directory is emptied when the server starts. Without
+METRICS_DIR only the rendering process is reported.
+
+Collectors registered with the registry add values that are computed
+when the values are written or rendered, such as cache statistics.
+"""
+import bisect
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _escape(value):
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\n', '\\n')
+        .replace('"', '\\"')
+    )
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        f'{key}="{_escape(value)}"' for key, value in labels
+    ) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Bucketed observations of one label set."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Registry:
+    """Thread-safe store of counters, gauges and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._values = defaultdict(dict)
+        self._collectors = []
+        self._flushed_at = None
+        self._pid = None
+        self._filename = None
+
+    def describe(self, name, kind, help_text, buckets=DEFAULT_BUCKETS):
+        """Declare metric name of kind counter, gauge or histogram."""
+        self._meta[name] = (kind, help_text, tuple(buckets))
+
+    def inc(self, name, value=1, **labels):
+        """Add value to a counter."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Set a gauge."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[name][key] = value
+
+    def observe(self, name, value, **labels):
+        """Record an observation in a histogram."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values[name]
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self._meta[name][2])
+            histogram.observe(value)
+
+    def get(self, name, **labels):
+        """Return the value of a counter or gauge, or None."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            return self._values.get(name, {}).get(key)
+
+    def register_collector(self, collector):
+        """Call collector with the registry before every render."""
+        self._collectors.append(collector)
+
+    def clear(self):
+        """Drop every recorded value."""
+        with self._lock:
+            self._values.clear()
+
+    def _snapshot(self):
+        """Return the recorded values in a JSON serializable form."""
+        snapshot = {}
+        with self._lock:
+            for name, series in self._values.items():
+                snapshot[name] = [
+                    [key, {'counts': list(value.counts), 'sum': value.sum}
+                     if isinstance(value, Histogram) else value]
+                    for key, value in series.items()
+                ]
+        return snapshot
+
+    def _merge(self, snapshots):
+        """Return the sum of snapshots of every process."""
+        values = defaultdict(dict)
+        for snapshot in snapshots:
+            for name, series in snapshot.items():
+                if name not in self._meta:
+                    continue
+                kind, _, buckets = self._meta[name]
+                for key, value in series:
+                    # Compared as text, as they are rendered.
+                    key = tuple((label, str(v)) for label, v in key)
+                    if kind != 'histogram':
+                        values[name][key] = values[name].get(key, 0) + value
+                        continue
+                    histogram = values[name].get(key)
+                    if histogram is None:
+                        histogram = values[name][key] = Histogram(buckets)
+                    histogram.counts = [
+                        total + count for total, count
+                        in zip(histogram.counts, value['counts'])
+                    ]
+                    histogram.sum += value['sum']
+        return values
+
+    def flush(self, force=False):
+        """Write the values of this process to its file in METRICS_DIR.
+
+        Does nothing without METRICS_DIR, or if the values were written
+        less than METRICS_FLUSH_INTERVAL seconds ago unless force is set.
+        """
+        directory = settings.METRICS_DIR
+        if not directory:
+            return
+        now = time.monotonic()
+        if self._pid != os.getpid():
+            # A forked worker writes a file of its own.
+            self._pid = os.getpid()
+            self._filename = f'{self._pid}-{uuid.uuid4().hex[:8]}.json'
+            self._flushed_at = None
+        elif not force and self._flushed_at is not None and \
+                now - self._flushed_at < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self._flushed_at = now
+
+        for collector in self._collectors:
+            collector(self)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as tmp_file:
+                json.dump(self._snapshot(), tmp_file)
+            os.replace(tmp_path, os.path.join(directory, self._filename))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _load_snapshots(self):
+        snapshots = []
+        pattern = os.path.join(settings.METRICS_DIR, '*.json')
+        for path in glob.glob(pattern):
+            try:
+                with open(path) as snapshot_file:
+                    snapshots.append(json.load(snapshot_file))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        if settings.METRICS_DIR:
+            self.flush(force=True)
+            values = self._merge(self._load_snapshots())
+        else:
+            for collector in self._collectors:
+                collector(self)
+            values = self._values
+
+        lines = []
+        with self._lock:
+            for name in sorted(values):
+                kind, help_text, _ = self._meta[name]
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for key, value in sorted(values[name].items()):
+                    if kind == 'histogram':
+                        lines.extend(self._render_histogram(name, key, value))
+                    else:
+                        lines.append(f'{name}{_labels(key)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def _render_histogram(self, name, key, histogram):
+        cumulative = 0
+        bounds = histogram.buckets + (float('inf'),)
+        for bound, count in zip(bounds, histogram.counts):
+            cumulative += count
+            labels = _labels(key + (('le', _number(bound)),))
+            yield f'{name}_bucket{labels} {cumulative}'
+        yield f'{name}_sum{_labels(key)} {_number(histogram.sum)}'
+        yield f'{name}_count{_labels(key)} {cumulative}'
+
+
+registry = Registry()
+
+
+def flush_metrics(sender, **kwargs):
+    """Write the metrics of this process after a request finishes."""
+    try:
+        registry.flush()
+    except OSError:
+        logger.exception(
+            'Could not write metrics to %s.', settings.METRICS_DIR,
+        )
@@ -0,0 +1,46 @@
+# Generated by Django 4.0.10 on 2026-10-18 09:00
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Keep one tag/ingredient per (user, name) and relink its recipes."""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, relation, column in (
+        ('Tag', 'tags', 'tag_id'),
+        ('Ingredient', 'ingredients', 'ingredient_id'),
+    ):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, relation).through
+        duplicates = model.objects.values('user_id', 'name').annotate(
+            keep_id=Min('id'),
+            total=Count('id'),
+        ).filter(total__gt=1)
+        for duplicate in duplicates:
+            keep_id = duplicate['keep_id']
+            drop_ids = list(model.objects.filter(
+                user_id=duplicate['user_id'],
+                name=duplicate['name'],
+            ).exclude(id=keep_id).values_list('id', flat=True))
+            linked = set(through.objects.filter(
+                **{column: keep_id}
+            ).values_list('recipe_id', flat=True))
+            for link in through.objects.filter(**{f'{column}__in': drop_ids}):
+                if link.recipe_id in linked:
+                    continue
+                setattr(link, column, keep_id)
+                link.save()
+                linked.add(link.recipe_id)
+            model.objects.filter(id__in=drop_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_product_price_product_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+    ]
@@ -5,7 +5,9 @@ import uuid
 import os
 
 from django.conf import settings
-from django.db import models
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, models
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import (
     AbstractBaseUser,
@@ -46,6 +48,66 @@ class UserManager(BaseUserManager):
         return user
 
 
+class UserNamedManager(models.Manager):
+    """Manager for models with a unique name per user."""
+
+    def _insert_returning(self, user, names):
+        """Insert names with ON CONFLICT DO NOTHING, return the new rows."""
+        connection = connections[self.db]
+        opts = self.model._meta
+        qn = connection.ops.quote_name
+        user_column = qn(opts.get_field('user').column)
+        sql = (
+            f'INSERT INTO {qn(opts.db_table)} ({qn("name")}, {user_column}) '
+            f'SELECT t.name, %s FROM unnest(%s::text[]) AS t(name) '
+            f'ON CONFLICT ({user_column}, {qn("name")}) DO NOTHING '
+            f'RETURNING {qn("id")}, {qn("name")}'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [user.pk, names])
+            rows = cursor.fetchall()
+
+        return {
+            name: self.model.from_db(
+                self.db, ['id', 'name', 'user_id'], [pk, name, user.pk],
+            )
+            for pk, name in rows
+        }
+
+    def get_or_create_names(self, user, names):
+        """Return a {name: object} dict for names, creating missing rows.
+
+        Safe under concurrent callers: missing rows are inserted with
+        ON CONFLICT DO NOTHING against the (user, name) constraint, and
+        rows that another transaction inserted first are read back after.
+        """
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+
+        objs = {
+            obj.name: obj for obj in self.filter(user=user, name__in=names)
+        }
+        # Insert in a stable order so concurrent callers cannot deadlock.
+        missing = sorted(name for name in names if name not in objs)
+        if missing:
+            if connections[self.db].vendor == 'postgresql':
+                objs.update(self._insert_returning(user, missing))
+            else:
+                self.bulk_create(
+                    [self.model(user=user, name=name) for name in missing],
+                    ignore_conflicts=True,
+                )
+            missing = [name for name in missing if name not in objs]
+        if missing:
+            objs.update(
+                (obj.name, obj)
+                for obj in self.filter(user=user, name__in=missing)
+            )
+
+        return objs
+
+
 class User(AbstractBaseUser, PermissionsMixin):
     """User in the system."""
     email = models.EmailField(max_length=255, unique=True)
@@ -77,6 +139,11 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField('Ingredient')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id'], name='recipe_user_id_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -88,6 +155,15 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    objects = UserNamedManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='tag_user_name_unique',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -100,6 +176,15 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    objects = UserNamedManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='ingredient_user_name_unique',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -115,3 +200,89 @@ class Product(models.Model):
     name = models.CharField(max_length=255, verbose_name=_("Product Name"))
     description = models.TextField(verbose_name=_("Description"))
     price = models.DecimalField(max_digits=10, decimal_places=2, null=True, verbose_name=_("Price"))
+
+
+class ImageJob(models.Model):
+    """Background processing job for an uploaded recipe image."""
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', _('Pending')
+        PROCESSING = 'processing', _('Processing')
+        DONE = 'done', _('Done')
+        FAILED = 'failed', _('Failed')
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='image_jobs',
+    )
+    source = models.CharField(max_length=255)
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    renditions = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='imagejob_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.source} ({self.status})'
+
+
+class ChunkedUpload(models.Model):
+    """Resumable upload of a file into a model's file field."""
+
+    class Status(models.TextChoices):
+        UPLOADING = 'uploading', _('Uploading')
+        COMPLETE = 'complete', _('Complete')
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.CharField(max_length=64)
+    content_object = GenericForeignKey('content_type', 'object_id')
+    field_name = models.CharField(max_length=100)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField(null=True, blank=True)
+    offset = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.UPLOADING,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.filename} ({self.offset} bytes)'
+
+
+class MediaBlob(models.Model):
+    """Content-addressed media file and the number of fields using it."""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['refcount', 'updated_at'],
+                name='mediablob_refcount_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,71 @@
+"""
+Pagination classes shared by the API views.
+"""
+from rest_framework.pagination import (
+    CursorPagination,
+    PageNumberPagination,
+)
+
+
+class RecipeAttrPagination(PageNumberPagination):
+    """Page number pagination for tags and ingredients.
+
+    Clients may pick a bounded ?page_size, or pass ?page_size=all to get
+    the user's whole vocabulary in a single unpaginated response.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    all_value = 'all'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return a page of results, or None when all were requested."""
+        if request.query_params.get(self.page_size_query_param) == \
+                self.all_value:
+            return None
+        return super().paginate_queryset(queryset, request, view=view)
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Keyset pagination over the newest-first recipe ordering."""
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class RecipeAttrCursorPagination(CursorPagination):
+    """Keyset pagination over the tag/ingredient name ordering."""
+    ordering = ('-name', 'id')
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class ProductCursorPagination(CursorPagination):
+    """Keyset pagination over the newest-first product ordering."""
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class CursorPaginationMixin:
+    """Switch a view to cursor pagination with ?pagination=cursor.
+
+    Cursor pages are addressed by an opaque position in the view's ordering
+    instead of an offset, so deep pages cost the same as the first one and
+    no COUNT(*) query is run.
+    """
+    cursor_pagination_class = None
+
+    def _use_cursor_pagination(self):
+        """Return True if the request opted in to cursor pagination."""
+        return (
+            self.cursor_pagination_class is not None
+            and self.request.query_params.get('pagination') == 'cursor'
+        )
+
+    @property
+    def paginator(self):
+        """The paginator instance associated with the view, or None."""
+        if not hasattr(self, '_paginator') and self._use_cursor_pagination():
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
@@ -0,0 +1,172 @@
+"""
+Password hashing off the request thread.
+
+Logins hash the submitted password in a small per-process thread pool,
+so at most PASSWORD_HASH_WORKERS hashes run at once per process. The
+request thread of a login waits for its hash, so logins beyond
+PASSWORD_HASH_MAX_PENDING are refused with a 503. The limit is kept
+below the worker's UWSGI_THREADS, so a login storm always leaves threads
+to serve other requests; PBKDF2 releases the GIL, so they do run.
+
+The PBKDF2 work factor comes from PASSWORD_HASH_ITERATIONS. Passwords
+hashed with other parameters are rehashed on the next successful login.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import (
+    PBKDF2PasswordHasher,
+    check_password,
+    make_password,
+)
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from core.metrics import registry
+
+
+registry.describe(
+    'password_hash_queue_seconds', 'histogram',
+    'Time password hashes waited for a pool thread.',
+)
+registry.describe(
+    'password_hash_seconds', 'histogram',
+    'Time spent hashing passwords.',
+)
+registry.describe(
+    'password_hash_pending', 'gauge',
+    'Password hashes queued or running.',
+)
+registry.describe(
+    'password_hash_rejected_total', 'counter',
+    'Logins refused because the password hash pool was full.',
+)
+registry.describe(
+    'password_rehashes_total', 'counter',
+    'Passwords rehashed on login with the current parameters.',
+)
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2 hasher with its iterations taken from the settings."""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
+
+
+class PasswordHashBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Too many logins in progress, try again shortly.')
+    default_code = 'password_hash_busy'
+
+
+class PasswordPool:
+    """Bounded thread pool for password hashing."""
+
+    def __init__(self, workers, max_pending):
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix='password-hash',
+        )
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def run(self, func, *args):
+        """Return func(*args) computed on a pool thread.
+
+        Raises PasswordHashBusy if max_pending calls are already queued
+        or running.
+        """
+        if not self._slots.acquire(blocking=False):
+            registry.inc('password_hash_rejected_total')
+            raise PasswordHashBusy()
+        self._track(1)
+        try:
+            future = self._executor.submit(
+                self._timed, time.perf_counter(), func, args,
+            )
+            return future.result()
+        finally:
+            self._track(-1)
+            self._slots.release()
+
+    def _track(self, delta):
+        with self._lock:
+            self._pending += delta
+            registry.set('password_hash_pending', self._pending)
+
+    def _timed(self, submitted, func, args):
+        started = time.perf_counter()
+        registry.observe('password_hash_queue_seconds', started - submitted)
+        try:
+            return func(*args)
+        finally:
+            registry.observe(
+                'password_hash_seconds', time.perf_counter() - started,
+            )
+
+
+def max_pending_logins():
+    """Return the login limit, leaving a request thread for other work."""
+    return max(
+        min(settings.PASSWORD_HASH_MAX_PENDING, settings.UWSGI_THREADS - 1),
+        1,
+    )
+
+
+def create_password_pool():
+    """Return a PasswordPool configured from the settings."""
+    return PasswordPool(
+        settings.PASSWORD_HASH_WORKERS,
+        max_pending_logins(),
+    )
+
+
+password_pool = create_password_pool()
+
+
+def check_user_password(user, raw_password):
+    """Return True if raw_password is the password of user.
+
+    The hash is verified in the pool; an outdated hash is replaced, also
+    computed in the pool, and saved from the calling thread.
+    """
+    outdated = []
+    valid = password_pool.run(
+        check_password, raw_password, user.password, outdated.append,
+    )
+    if valid and outdated:
+        user.password = password_pool.run(make_password, raw_password)
+        user.save(update_fields=['password'])
+        registry.inc('password_rehashes_total')
+    return valid
+
+
+class PooledModelBackend(ModelBackend):
+    """ModelBackend verifying passwords in the password hash pool."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway, so unknown users take as long as wrong
+            # passwords.
+            password_pool.run(make_password, password)
+            return None
+        if check_user_password(user, password) and \
+                self.user_can_authenticate(user):
+            return user
+        return None
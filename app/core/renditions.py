@@ -0,0 +1,137 @@
+"""
+On-demand image renditions with a size-bounded disk cache.
+
+srcsets point at the renditions an image job already produced and fall
+back to this endpoint only for sizes the job did not render, such as
+before it completes. Each on-demand rendition is generated once and
+stored under a content-addressed name in MEDIA_ROOT/renditions/, where
+nginx serves it directly. gc_media trims the cache least-recently-used
+first once it grows past RENDITION_CACHE_MAX_BYTES; every lookup
+refreshes the file's mtime.
+"""
+import hashlib
+import os
+import tempfile
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+from core.images import (
+    open_verified_image,
+    render_image,
+    rendition_storage,
+)
+from core.storage import BLOB_DIR
+
+
+CACHE_DIR = 'renditions'
+
+
+def rendition_name(source_name, width, fmt):
+    """Return the cache name of a rendition of source_name."""
+    stat = os.stat(default_storage.path(source_name))
+    key = hashlib.sha256(
+        f'{source_name}:{stat.st_size}:{stat.st_mtime_ns}:{width}:{fmt}'
+        .encode()
+    ).hexdigest()
+    return f'{CACHE_DIR}/{key[:2]}/{key}.{fmt}'
+
+
+def evict(max_bytes):
+    """Delete least recently used renditions until the cache fits.
+
+    Walks the whole cache, so it is run by gc_media rather than on
+    requests. Returns the number of bytes freed.
+    """
+    root = rendition_storage.path(CACHE_DIR)
+    entries = []
+    total = 0
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+    freed = 0
+    for _, size, path in sorted(entries):
+        if total - freed <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        freed += size
+    return freed
+
+
+def get_rendition(source_name, width, fmt):
+    """Return the cache name of a rendition, generating it if needed."""
+    name = rendition_name(source_name, width, fmt)
+    path = rendition_storage.path(name)
+    try:
+        os.utime(path)
+        return name
+    except FileNotFoundError:
+        pass
+
+    image = open_verified_image(source_name)
+    _, content = render_image(image, width, fmt)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as tmp_file:
+        tmp_file.write(content)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+    return name
+
+
+def is_valid_source(source_name):
+    """Return True if source_name is an uploaded file that may be rendered."""
+    normalized = os.path.normpath(source_name)
+    return (
+        normalized == source_name
+        and normalized.startswith(('uploads/', f'{BLOB_DIR}/'))
+        and default_storage.exists(normalized)
+    )
+
+
+def rendition_url(source_name, width, fmt='webp', request=None):
+    """Return the URL serving a rendition of source_name."""
+    query = urlencode({'path': source_name, 'w': width, 'fmt': fmt})
+    url = f"{reverse('rendition')}?{query}"
+    return request.build_absolute_uri(url) if request else url
+
+
+def build_srcset(source_name, fmt='webp', request=None, renditions=()):
+    """Return a srcset attribute value listing every rendition width.
+
+    renditions are the specs an image job rendered from source_name; they
+    are linked directly, and only widths they lack are rendered on
+    demand. Widths above the largest rendition, which is the full image,
+    are left out.
+    """
+    if not source_name:
+        return None
+    rendered = {
+        item['width']: item['name'] for item in renditions
+        if item['format'] == fmt
+    }
+    full_width = max((item['width'] for item in renditions), default=None)
+    entries = []
+    for width in sorted(set(settings.IMAGE_RENDITION_WIDTHS) | set(rendered)):
+        if width in rendered:
+            url = rendition_storage.url(rendered[width])
+            if request is not None:
+                url = request.build_absolute_uri(url)
+        elif full_width is not None and width > full_width:
+            continue
+        else:
+            url = rendition_url(source_name, width, fmt, request)
+        entries.append(f'{url} {width}w')
+    return ', '.join(entries)
@@ -0,0 +1,341 @@
+"""
+Deterministic synthetic data for load testing.
+
+Rows are generated in fixed-size shards, each from its own RNG seeded by
+the run seed and the shard number, so the same options always produce the
+same data however many worker processes share the work. On Postgres the
+rows of a shard are written with COPY; other databases use bulk_create.
+"""
+import io
+import itertools
+import random
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Max
+
+from core.models import Product, Recipe
+
+
+ADJECTIVES = (
+    'Spicy', 'Sweet', 'Smoky', 'Crispy', 'Creamy', 'Tangy', 'Roasted',
+    'Grilled', 'Fresh', 'Savory', 'Zesty', 'Hearty', 'Golden', 'Herbed',
+    'Pickled', 'Braised',
+)
+FOODS = (
+    'Chicken', 'Rice', 'Beans', 'Tomato', 'Garlic', 'Lentils', 'Mango',
+    'Cassava', 'Spinach', 'Coconut', 'Tofu', 'Pepper', 'Onion', 'Fish',
+    'Plantain', 'Ginger', 'Cheese', 'Noodles', 'Avocado', 'Lamb',
+)
+DISHES = (
+    'Curry', 'Stew', 'Salad', 'Soup', 'Bowl', 'Pilau', 'Tacos', 'Pie',
+    'Skewers', 'Stir Fry', 'Wrap', 'Bake',
+)
+
+DISTRIBUTIONS = ('uniform', 'zipf')
+
+_plan = None
+
+
+def shard_rng(seed, *key):
+    """Return the RNG of one shard of a seeding run."""
+    return random.Random(':'.join(str(part) for part in (seed, *key)))
+
+
+def cumulative_weights(count, distribution, skew):
+    """Return cumulative weights to pick among count items by rank.
+
+    Returns None for a uniform pick. With zipf, the item of rank r is
+    picked with a probability proportional to 1 / (r + 1) ** skew.
+    """
+    if distribution == 'uniform' or count == 0:
+        return None
+    return list(itertools.accumulate(
+        1 / (rank + 1) ** skew for rank in range(count)
+    ))
+
+
+def item_name(index):
+    """Return a unique, readable tag or ingredient name for index."""
+    size = len(ADJECTIVES) * len(FOODS)
+    name = (
+        f'{ADJECTIVES[index % len(ADJECTIVES)]} '
+        f'{FOODS[index // len(ADJECTIVES) % len(FOODS)]}'
+    )
+    return name if index < size else f'{name} {index // size}'
+
+
+def _copy_value(value):
+    """Return value in the text format of COPY."""
+    if value is None:
+        return r'\N'
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+def write_rows(model, fields, rows):
+    """Insert rows, tuples of values for fields, into model's table.
+
+    COPY skips model defaults and auto_now, so every column without a
+    database default must be listed in fields.
+    """
+    opts = model._meta
+    if connection.vendor != 'postgresql':
+        attnames = [opts.get_field(field).attname for field in fields]
+        model.objects.bulk_create(
+            [model(**dict(zip(attnames, row))) for row in rows],
+            batch_size=1000,
+        )
+        return
+
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_value(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(opts.get_field(field).column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {qn(opts.db_table)} ({columns}) FROM STDIN',
+            buffer,
+        )
+
+
+def reserve_ids(model, count):
+    """Reserve count consecutive primary keys of model, return the first."""
+    table = model._meta.db_table
+    if connection.vendor != 'postgresql':
+        last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        return last + 1
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        qn = connection.ops.quote_name
+        # Inserts take ROW EXCLUSIVE before drawing from the sequence, so
+        # this lock keeps them from landing inside the reserved range.
+        cursor.execute(f'LOCK TABLE {qn(table)} IN SHARE ROW EXCLUSIVE MODE')
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        sequence = cursor.fetchone()[0]
+        cursor.execute('SELECT nextval(%s)', [sequence])
+        first = cursor.fetchone()[0]
+        cursor.execute('SELECT setval(%s, %s)', [sequence, first + count - 1])
+    return first
+
+
+def seed_users(count, password):
+    """Create count seed users, return their ids in order."""
+    User = get_user_model()
+    emails = [f'seed-user-{i}@example.com' for i in range(count)]
+    hashed = make_password(password)
+    User.objects.bulk_create(
+        [
+            User(email=email, name=f'Seed User {i}', password=hashed)
+            for i, email in enumerate(emails)
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    ids = dict(
+        User.objects.filter(email__in=emails).values_list('email', 'id')
+    )
+    return [ids[email] for email in emails]
+
+
+def seed_named(model, user_ids, per_user):
+    """Create per_user tags or ingredients for every user.
+
+    Returns the ids of each user's items, ordered by rank.
+    """
+    names = [item_name(index) for index in range(per_user)]
+    User = get_user_model()
+    ids = []
+    for user_id in user_ids:
+        objs = model.objects.get_or_create_names(User(pk=user_id), names)
+        ids.append([objs[name].pk for name in names])
+    return ids
+
+
+def _pick(rng, items, cum_weights, mean):
+    """Pick about mean distinct items, favouring low ranks if weighted."""
+    if not items or mean <= 0:
+        return []
+    count = rng.randint(0, 2 * mean)
+    picked = rng.choices(range(len(items)), cum_weights=cum_weights, k=count)
+    return [items[index] for index in dict.fromkeys(picked)]
+
+
+def generate_recipes(plan, shard):
+    """Write one shard of recipes together with their tags/ingredients."""
+    rng = shard_rng(plan['seed'], 'recipes', shard)
+    start = shard * plan['shard_size']
+    stop = min(start + plan['shard_size'], plan['recipes'])
+    user_range = range(len(plan['user_ids']))
+    recipes = []
+    tag_links = []
+    ingredient_links = []
+    for index in range(start, stop):
+        recipe_id = plan['first_recipe_id'] + index
+        user = rng.choices(user_range, cum_weights=plan['user_weights'])[0]
+        recipes.append((
+            recipe_id,
+            plan['user_ids'][user],
+            f'{rng.choice(ADJECTIVES)} {rng.choice(FOODS)} '
+            f'{rng.choice(DISHES)}',
+            f'Seed recipe {index}.',
+            rng.randint(5, 240),
+            Decimal(rng.randint(100, 99999)) / 100,
+            f'https://example.com/recipes/{index}',
+            None,
+        ))
+        tag_links.extend(
+            (recipe_id, tag_id) for tag_id in _pick(
+                rng, plan['tag_ids'][user], plan['tag_weights'],
+                plan['tags_per_recipe'],
+            )
+        )
+        ingredient_links.extend(
+            (recipe_id, ingredient_id) for ingredient_id in _pick(
+                rng, plan['ingredient_ids'][user],
+                plan['ingredient_weights'], plan['ingredients_per_recipe'],
+            )
+        )
+
+    with transaction.atomic():
+        write_rows(Recipe, [
+            'id', 'user', 'title', 'description', 'time_minutes', 'price',
+            'link', 'image',
+        ], recipes)
+        write_rows(Recipe.tags.through, ['recipe', 'tag'], tag_links)
+        write_rows(
+            Recipe.ingredients.through, ['recipe', 'ingredient'],
+            ingredient_links,
+        )
+    return len(recipes)
+
+
+def generate_products(plan, shard):
+    """Write one shard of products."""
+    rng = shard_rng(plan['seed'], 'products', shard)
+    start = shard * plan['shard_size']
+    stop = min(start + plan['shard_size'], plan['products'])
+    products = [
+        (
+            rng.choice(plan['user_ids']),
+            f'{rng.choice(ADJECTIVES)} {rng.choice(FOODS)} {index}',
+            f'Seed product {index}.',
+            Decimal(rng.randint(100, 999999)) / 100,
+        )
+        for index in range(start, stop)
+    ]
+    with transaction.atomic():
+        write_rows(Product, ['user', 'name', 'description', 'price'], products)
+    return len(products)
+
+
+GENERATORS = {
+    'recipes': generate_recipes,
+    'products': generate_products,
+}
+
+
+def init_worker(plan):
+    """Make plan available to the shards run by a worker process."""
+    global _plan
+    _plan = plan
+
+
+def run_shard(task):
+    """Run one (kind, shard) task with the plan of the worker process."""
+    kind, shard = task
+    return GENERATORS[kind](_plan, shard)
+
+
+def _uuid(rng):
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def seed_books(plan, count, languages):
+    """Create count book versions with a section tree per language.
+
+    Returns the number of rows written, or None if the book app is not
+    installed.
+    """
+    if not apps.is_installed('book'):
+        return None
+
+    Version = apps.get_model('book', 'Version')
+    VersionDetail = apps.get_model('book', 'VersionDetail')
+    Section = apps.get_model('book', 'Section')
+    SectionDetail = apps.get_model('book', 'SectionDetail')
+    rng = shard_rng(plan['seed'], 'books')
+    versions, details, sections, section_details = [], [], [], []
+    for index in range(count):
+        user_id = rng.choice(plan['user_ids'])
+        version = Version(
+            id=_uuid(rng),
+            user_id=user_id,
+            updated_by_id=user_id,
+            published_on=date(2000, 1, 1) + timedelta(days=index),
+            email=f'publisher-{index}@example.com',
+            write_name=f'Author {index}',
+            publisher=f'Publisher {index % 50}',
+            version_number=f'{index // 10}.{index % 10}',
+            website=f'https://example.com/books/{index}',
+            phone_number='+255700000000',
+            version_name=f'Edition {index}',
+        )
+        versions.append(version)
+        for language in languages:
+            detail = VersionDetail(
+                id=_uuid(rng),
+                user_id=user_id,
+                updated_by_id=user_id,
+                version=version,
+                language=language,
+                title=f'Book {index} ({language})',
+                description=f'Seed book {index}.',
+                physical_address=f'{index} Market Street',
+                summary=f'Summary of book {index} in {language}.',
+            )
+            details.append(detail)
+            for section_index in range(plan['sections_per_book']):
+                section = Section(
+                    id=_uuid(rng),
+                    user_id=user_id,
+                    updated_by_id=user_id,
+                    version=detail,
+                    section_name=f'Section {section_index}',
+                )
+                sections.append(section)
+                section_details.extend(
+                    SectionDetail(
+                        id=_uuid(rng),
+                        user_id=user_id,
+                        updated_by_id=user_id,
+                        section=section,
+                        language=section_language,
+                        title=f'Section {section_index} ({section_language})',
+                        description=f'Seed section {section_index}.',
+                    )
+                    for section_language in languages
+                )
+
+    with transaction.atomic():
+        for model, objs in (
+            (Version, versions),
+            (VersionDetail, details),
+            (Section, sections),
+            (SectionDetail, section_details),
+        ):
+            model.objects.bulk_create(objs, batch_size=1000)
+    return len(versions) + len(details) + len(sections) + len(section_details)
@@ -0,0 +1,51 @@
+"""
+Serializers for core APIs.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import serializers
+
+from core.models import ChunkedUpload
+from core.uploads import UPLOAD_TARGETS, get_target_model
+
+
+class ChunkedUploadSerializer(serializers.ModelSerializer):
+    """Serializer for resumable chunked uploads."""
+    target = serializers.ChoiceField(
+        choices=list(UPLOAD_TARGETS),
+        write_only=True,
+    )
+
+    class Meta:
+        model = ChunkedUpload
+        fields = [
+            'id', 'target', 'object_id', 'filename', 'size', 'offset',
+            'status', 'sha256', 'created_at',
+        ]
+        read_only_fields = ['id', 'offset', 'status', 'sha256', 'created_at']
+
+    def validate(self, attrs):
+        """Resolve the upload target and check the user may write to it."""
+        target = attrs.pop('target')
+        model = get_target_model(target)
+        if model is None:
+            raise serializers.ValidationError(
+                {'target': _('Uploads to this target are not available.')}
+            )
+
+        user = self.context['request'].user
+        try:
+            obj = model.objects.filter(pk=attrs['object_id']).first()
+        except (ValueError, TypeError):
+            # Not a valid primary key of the target model.
+            obj = None
+        owner_id = getattr(obj, 'user_id', None)
+        if obj is None or not (owner_id == user.pk or user.is_staff):
+            raise serializers.ValidationError(
+                {'object_id': _('Object not found.')}
+            )
+
+        attrs['content_type'] = ContentType.objects.get_for_model(model)
+        attrs['field_name'] = UPLOAD_TARGETS[target][1]
+        return attrs
@@ -0,0 +1,137 @@
+"""
+Signal handlers keeping media blob reference counts, image renditions and
+cached responses current.
+"""
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_save,
+)
+
+from core.cache import invalidate_scope
+
+
+def _file_fields(model):
+    return [
+        field for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField)
+    ]
+
+
+def _release_after_commit(names):
+    release = getattr(default_storage, 'release', None)
+    if release is None:
+        return
+    for name in names:
+        if name:
+            transaction.on_commit(lambda name=name: release(name))
+
+
+def release_replaced_files(sender, instance, update_fields=None, **kwargs):
+    """Release files replaced by a new value on save."""
+    if instance._state.adding or instance.pk is None:
+        return
+    fields = [
+        field for field in _file_fields(sender)
+        if update_fields is None or field.attname in update_fields
+    ]
+    if not fields:
+        return
+    old_values = sender._base_manager.filter(pk=instance.pk).values_list(
+        *[field.attname for field in fields],
+    ).first()
+    if old_values is None:
+        return
+    _release_after_commit(
+        old for field, old in zip(fields, old_values)
+        if old != getattr(instance, field.attname).name
+    )
+
+
+def release_deleted_files(sender, instance, **kwargs):
+    """Release the files of a deleted object."""
+    _release_after_commit(
+        getattr(instance, field.attname).name
+        for field in _file_fields(sender)
+    )
+
+
+def connect_media_signals(models_list):
+    """Connect the handlers to every model with a file field."""
+    for model in models_list:
+        if _file_fields(model):
+            pre_save.connect(release_replaced_files, sender=model)
+            post_delete.connect(release_deleted_files, sender=model)
+
+
+def delete_replaced_renditions(sender, instance, update_fields=None,
+                               **kwargs):
+    """Delete the renditions of a recipe image replaced on save."""
+    from core.images import delete_job_renditions
+
+    if instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    jobs = instance.image_jobs.exclude(source=instance.image.name)
+    job_ids = list(jobs.exclude(renditions=[]).values_list('pk', flat=True))
+    if not job_ids:
+        return
+    jobs.filter(pk__in=job_ids).update(renditions=[])
+    for job_id in job_ids:
+        transaction.on_commit(
+            lambda job_id=job_id: delete_job_renditions(job_id)
+        )
+
+
+def delete_job_rendition_files(sender, instance, **kwargs):
+    """Delete the renditions of a deleted image job."""
+    from core.images import delete_job_renditions
+
+    transaction.on_commit(lambda: delete_job_renditions(instance.pk))
+
+
+def connect_rendition_signals():
+    """Delete renditions with the image jobs and images they belong to."""
+    from core.models import ImageJob, Recipe
+
+    pre_save.connect(delete_replaced_renditions, sender=Recipe)
+    post_delete.connect(delete_job_rendition_files, sender=ImageJob)
+
+
+def invalidate_user_responses(sender, instance, **kwargs):
+    """Drop the cached responses of the owner of a saved object.
+
+    Covers writes that bypass the API views, such as the admin.
+    """
+    action = kwargs.get('action')
+    if action is not None and not action.startswith('post_'):
+        return
+    invalidate_scope(f'user:{instance.user_id}')
+
+
+def invalidate_product_responses(sender, instance, **kwargs):
+    """Drop the cached product responses."""
+    invalidate_scope('product')
+
+
+def invalidate_job_responses(sender, instance, **kwargs):
+    """Drop the cached responses listing the renditions of an image job."""
+    invalidate_scope(f'user:{instance.recipe.user_id}')
+
+
+def connect_cache_signals():
+    """Invalidate cached responses on every write to their models."""
+    from core.models import ImageJob, Ingredient, Product, Recipe, Tag
+
+    for model in (Recipe, Tag, Ingredient):
+        post_save.connect(invalidate_user_responses, sender=model)
+        post_delete.connect(invalidate_user_responses, sender=model)
+    for through in (Recipe.tags.through, Recipe.ingredients.through):
+        m2m_changed.connect(invalidate_user_responses, sender=through)
+    post_save.connect(invalidate_product_responses, sender=Product)
+    post_delete.connect(invalidate_product_responses, sender=Product)
+    post_save.connect(invalidate_job_responses, sender=ImageJob)
@@ -0,0 +1,241 @@
+"""
+Statement-level slow query log.
+
+A SlowQueryLogger is installed on every database connection as it is
+created. Statements slower than SLOW_QUERY_THRESHOLD_MS are written as
+JSON lines to a rotating log, with a fingerprint of their normalized SQL
+and the view that ran them. Each process writes and rotates a log of its
+own next to SLOW_QUERY_LOG_FILE, as processes can't safely rotate a
+shared file; readers merge them. With SLOW_QUERY_EXPLAIN, a slow SELECT is
+re-run under EXPLAIN (ANALYZE, BUFFERS) at most once per fingerprint and
+interval, and the plan is logged with it. The slow_queries management
+command aggregates the log per fingerprint.
+"""
+import contextvars
+import glob
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+
+from core.instrumentation import view_labels
+
+
+logger = logging.getLogger(__name__)
+
+_current_view = contextvars.ContextVar('slow_query_view', default=None)
+
+_NORMALIZE = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'"s\d+_x\d+"'), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def normalize(sql):
+    """Return sql with literals and placeholder lists collapsed."""
+    for pattern, replacement in _NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(sql):
+    """Return a short, stable id of the shape of sql."""
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:16]
+
+
+_handlers = {}
+_handlers_lock = threading.Lock()
+
+
+def _get_handler(path):
+    with _handlers_lock:
+        handler = _handlers.get(path)
+        if handler is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                path,
+                maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+                backupCount=settings.SLOW_QUERY_LOG_BACKUPS,
+                delay=True,
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            _handlers[path] = handler
+    return handler
+
+
+def process_log_path(path):
+    """Return the log of this process for the slow query log at path."""
+    root, ext = os.path.splitext(path)
+    return f'{root}.{os.getpid()}{ext}'
+
+
+def write_entry(entry):
+    """Append entry to this process's slow query log as one JSON line."""
+    record = logging.makeLogRecord({
+        'name': __name__,
+        'levelno': logging.WARNING,
+        'levelname': 'WARNING',
+        'msg': json.dumps(entry, default=str),
+    })
+    _get_handler(process_log_path(settings.SLOW_QUERY_LOG_FILE)).handle(
+        record,
+    )
+
+
+def _log_paths(path):
+    """Return the logs of every process for the slow query log at path."""
+    root, ext = os.path.splitext(path)
+    pattern = re.compile(re.escape(root) + r'\.\d+' + re.escape(ext))
+    return [path] + sorted(
+        log_path
+        for log_path in glob.glob(f'{glob.escape(root)}.*{glob.escape(ext)}')
+        if pattern.fullmatch(log_path)
+    )
+
+
+def read_entries(path):
+    """Yield the entries of the slow query log at path.
+
+    The logs of every process are read in turn, each from its oldest
+    rotated file on.
+    """
+    for process_path in _log_paths(path):
+        paths = [
+            f'{process_path}.{index}'
+            for index in range(settings.SLOW_QUERY_LOG_BACKUPS, 0, -1)
+        ] + [process_path]
+        for log_path in paths:
+            try:
+                log_file = open(log_path)
+            except FileNotFoundError:
+                continue
+            with log_file:
+                for line in log_file:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+
+class SlowQueryLogger:
+    """Execute wrapper logging statements over the slow query threshold."""
+
+    def __init__(self):
+        self._explained = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            if duration >= settings.SLOW_QUERY_THRESHOLD_MS:
+                try:
+                    self.log(sql, params, many, context, duration)
+                except Exception:
+                    logger.exception('Could not log a slow query.')
+
+    def log(self, sql, params, many, context, duration):
+        """Write a slow statement, and its plan if due, to the log."""
+        key = fingerprint(sql)
+        view = _current_view.get()
+        explain = None
+        if self.should_explain(key, sql, many, context):
+            explain = self.explain(sql, params, context['connection'])
+        write_entry({
+            'time': timezone.now().isoformat(),
+            'fingerprint': key,
+            'duration_ms': round(duration, 3),
+            'view': view,
+            'sql': normalize(sql),
+            'explain': explain,
+        })
+        logger.warning(
+            'Slow query %s (%.1fms) in %s', key, duration, view or '-',
+        )
+
+    def should_explain(self, key, sql, many, context):
+        """Return True if the plan of sql should be captured now."""
+        if not settings.SLOW_QUERY_EXPLAIN or many:
+            return False
+        if context['connection'].vendor != 'postgresql':
+            return False
+        # ANALYZE runs the statement again; never do that to a write.
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return False
+        now = time.monotonic()
+        with self._lock:
+            last = self._explained.get(key)
+            if last is not None and \
+                    now - last < settings.SLOW_QUERY_EXPLAIN_INTERVAL:
+                return False
+            self._explained[key] = now
+        return True
+
+    def explain(self, sql, params, connection):
+        """Return the EXPLAIN (ANALYZE, BUFFERS) output of sql, or None.
+
+        The plan is read on a separate raw cursor, so the results of the
+        original statement stay pending and no wrapper sees the EXPLAIN.
+        """
+        in_transaction = not connection.get_autocommit()
+        with connection.connection.cursor() as cursor:
+            if in_transaction:
+                cursor.execute('SAVEPOINT slow_query_explain')
+            try:
+                cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params)
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+            except Exception:
+                if in_transaction:
+                    cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+                logger.exception('Could not explain a slow query.')
+                return None
+            if in_transaction:
+                cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+        return plan
+
+
+slow_query_logger = SlowQueryLogger()
+
+
+def install_slow_query_logger(sender, connection, **kwargs):
+    """Add the slow query logger to a newly created connection.
+
+    It is inserted innermost: execute_wrapper() context managers pop the
+    last wrapper when they exit, so appending could remove it again when
+    a connection is opened inside one.
+    """
+    if slow_query_logger not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, slow_query_logger)
+
+
+class SlowQueryViewMiddleware:
+    """Make the current view known to the slow query log."""
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_LOG_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _current_view.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            _current_view.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _current_view.set('%s (%s)' % view_labels(request))
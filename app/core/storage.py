@@ -0,0 +1,106 @@
+"""
+Content-addressed, deduplicated media storage.
+
+Every file is stored once under a name derived from the SHA-256 of its
+content, so the same image uploaded for many recipes or book sections takes
+disk space once. A MediaBlob row counts the model fields referencing each
+blob; model signals keep the counts current and the gc_media management
+command removes blobs nobody references any more.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+BLOB_DIR = 'blobs'
+
+
+def blob_name(digest, ext):
+    """Return the storage name of the blob with digest."""
+    return f'{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext.lower()}'
+
+
+def is_blob(name):
+    """Return True if name refers to a content-addressed blob."""
+    return bool(name) and name.startswith(f'{BLOB_DIR}/')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that stores each distinct content once."""
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is chosen from the content in _save.
+        return name
+
+    def _save(self, name, content):
+        tmp_dir = self.path(f'{BLOB_DIR}/tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        hasher = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    hasher.update(chunk)
+                    tmp_file.write(chunk)
+            return self.adopt(tmp_path, hasher.hexdigest(), name)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def adopt(self, path, digest, name):
+        """Move the file at path into the blob store and reference it.
+
+        path must already be on the same file system as the store and
+        digest must be its SHA-256. The file is discarded if the blob
+        already exists. Returns the blob name.
+        """
+        from core.models import MediaBlob
+
+        final_name = blob_name(digest, os.path.splitext(name)[1])
+        final_path = self.path(final_name)
+        size = os.path.getsize(path)
+        with transaction.atomic():
+            # The row lock keeps gc_media from removing the file between
+            # the existence check and the reference being taken.
+            blobs = MediaBlob.objects.select_for_update()
+            blob, created = blobs.get_or_create(
+                name=final_name,
+                defaults={'size': size, 'refcount': 1},
+            )
+            if not created:
+                MediaBlob.objects.filter(pk=blob.pk).update(
+                    refcount=F('refcount') + 1,
+                )
+            if os.path.exists(final_path):
+                os.remove(path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.chmod(path, self.file_permissions_mode or 0o644)
+                os.replace(path, final_path)
+        return final_name
+
+    def release(self, name):
+        """Drop one reference to a blob."""
+        from core.models import MediaBlob
+
+        if is_blob(name):
+            MediaBlob.objects.filter(name=name, refcount__gt=0).update(
+                refcount=F('refcount') - 1,
+                updated_at=timezone.now(),
+            )
+
+    def delete(self, name):
+        # Blobs may be shared; they are removed by gc_media once unused.
+        if not is_blob(name):
+            super().delete(name)
+
+    def delete_blob(self, name):
+        """Remove the file of a blob; only gc_media should call this."""
+        super().delete(name)
@@ -0,0 +1,149 @@
+"""
+Tests for the cached and stateless authentication classes.
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.authentication import StatelessJWTAuthentication, token_cache
+
+
+ME_URL = reverse('user:me')
+
+
+def token_queries(queries):
+    return [
+        query for query in queries if 'authtoken_token' in query['sql']
+    ]
+
+
+@override_settings(AUTH_TOKEN_CACHE_ENABLED=True)
+class CachedTokenAuthenticationTests(TestCase):
+    """Test token-authenticated users are served from the cache."""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get_me(self):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(ME_URL)
+        return res, token_queries(queries.captured_queries)
+
+    def warm_cache(self):
+        # The first lookup of a token is verified by a second one.
+        for _ in range(2):
+            res, queries = self.get_me()
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(queries), 1)
+
+    def test_cached_user_skips_lookup(self):
+        """Test a cached token needs no token lookup."""
+        self.warm_cache()
+
+        res, queries = self.get_me()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+        self.assertEqual(queries, [])
+
+    def test_writes_load_user(self):
+        """Test unsafe methods always look the token up."""
+        self.warm_cache()
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(ME_URL, {'name': 'New Name'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(token_queries(queries.captured_queries)), 1)
+
+    def test_password_change_invalidates(self):
+        """Test changing the password drops the cached user."""
+        self.warm_cache()
+
+        self.user.set_password('newpass123')
+        self.user.save()
+        res, queries = self.get_me()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+
+    def test_deactivation_invalidates(self):
+        """Test a deactivated user is rejected at once."""
+        self.warm_cache()
+
+        self.user.is_active = False
+        self.user.save()
+        res, _ = self.get_me()
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_token_deletion_invalidates(self):
+        """Test a deleted token is rejected at once."""
+        self.warm_cache()
+
+        self.token.delete()
+        res, _ = self.get_me()
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(
+        AUTH_TOKEN_CACHE_ENABLED=None,
+        CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }},
+    )
+    def test_not_cached_with_per_process_cache(self):
+        """Test snapshots are not used unless the cache is shared."""
+        for _ in range(3):
+            res, queries = self.get_me()
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(queries), 1)
+
+
+@override_settings(AUTH_JWT_STATELESS_READS=True)
+class StatelessJWTAuthenticationTests(TestCase):
+    """Test JWT reads are authenticated from the token claims."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        access = RefreshToken.for_user(self.user).access_token
+        self.factory = APIRequestFactory()
+        self.header = f'Bearer {access}'
+
+    def authenticate(self, method):
+        request = self.factory.generic(
+            method, '/', HTTP_AUTHORIZATION=self.header,
+        )
+        return StatelessJWTAuthentication().authenticate(request)
+
+    def test_read_skips_lookup(self):
+        """Test a GET builds the user without a query."""
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate('GET')
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertTrue(user.is_authenticated)
+
+    def test_write_loads_user(self):
+        """Test a POST loads the user from the database."""
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate('POST')
+
+        self.assertEqual(user.email, self.user.email)
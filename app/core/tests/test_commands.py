@@ -1,13 +1,21 @@
 """
 Test custom Django management commands.
 """
+import json
+import tempfile
+from io import StringIO
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2OpError
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
+
+from core import benchmark
+from core.models import Ingredient, Product, Recipe, Tag
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -31,4 +39,116 @@ class CommandTests(SimpleTestCase):
         call_command('wait_for_db')
 
         self.assertEqual(patched_check.call_count, 6)
-        patched_check.assert_called_with(databases=['default'])
\ No newline at end of file
+        patched_check.assert_called_with(databases=['default'])
+
+
+class SeedDataCommandTests(TestCase):
+    """Test the seed_data command."""
+
+    def seed(self, **options):
+        """Run seed_data with small sizes in this process."""
+        params = {
+            'users': 3,
+            'recipes': 25,
+            'tags_per_user': 5,
+            'ingredients_per_user': 8,
+            'products': 4,
+            'batch_size': 10,
+            'workers': 1,
+            'stdout': StringIO(),
+        }
+        params.update(options)
+        call_command('seed_data', **params)
+
+    def snapshot(self):
+        """Return the seeded recipes with their tag and ingredient names."""
+        return [
+            (
+                recipe.user.email,
+                recipe.title,
+                recipe.price,
+                sorted(tag.name for tag in recipe.tags.all()),
+                sorted(item.name for item in recipe.ingredients.all()),
+            )
+            for recipe in Recipe.objects.order_by('id').prefetch_related(
+                'tags', 'ingredients',
+            ).select_related('user')
+        ]
+
+    def test_seed_data(self):
+        """Test seeding creates the requested volumes."""
+        self.seed()
+
+        users = get_user_model().objects.filter(email__startswith='seed-')
+        self.assertEqual(users.count(), 3)
+        self.assertEqual(Recipe.objects.count(), 25)
+        self.assertEqual(Tag.objects.count(), 15)
+        self.assertEqual(Ingredient.objects.count(), 24)
+        self.assertEqual(Product.objects.count(), 4)
+        self.assertTrue(users.first().check_password('seedpass123'))
+
+    def test_seed_data_deterministic(self):
+        """Test the same seed produces the same data."""
+        self.seed(seed=7)
+        first = self.snapshot()
+        Recipe.objects.all().delete()
+        self.seed(seed=7)
+
+        self.assertEqual(self.snapshot(), first)
+
+
+class BenchmarkCommandTests(TestCase):
+    """Test the benchmark command."""
+
+    def setUp(self):
+        call_command(
+            'seed_data', users=1, recipes=5, tags_per_user=4,
+            ingredients_per_user=6, workers=1, stdout=StringIO(),
+        )
+
+    def test_benchmark_writes_results(self):
+        """Test the benchmark records every scenario and cleans up."""
+        recipes = Recipe.objects.count()
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command(
+                'benchmark', iterations=2, warmup=1,
+                allocation_iterations=1, output=output.name,
+                stdout=StringIO(),
+            )
+            results = json.load(output)
+
+        self.assertEqual(
+            set(results['results']),
+            {scenario.name for scenario in benchmark.SCENARIOS},
+        )
+        for result in results['results'].values():
+            self.assertEqual(result['requests'], 2)
+            self.assertIn('p99', result['latency_ms'])
+            self.assertIn('mean', result['queries'])
+            self.assertIn('peak', result['allocations_kib'])
+        self.assertEqual(
+            results['results']['recipe-create']['status'], {'201': 2},
+        )
+        self.assertEqual(results['meta']['dataset']['user_recipes'], 5)
+        self.assertEqual(Recipe.objects.count(), recipes)
+        self.assertFalse(Product.objects.exists())
+
+    def test_benchmark_compare_reports_regressions(self):
+        """Test comparing against a faster baseline fails the command."""
+        baseline = {
+            'results': {
+                'recipe-list': {
+                    'latency_ms': {'p50': 0.001, 'p90': 0.001},
+                    'queries': {'mean': 0},
+                },
+            },
+        }
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as base:
+            json.dump(baseline, base)
+            base.flush()
+            with self.assertRaisesMessage(CommandError, 'recipe-list'):
+                call_command(
+                    'benchmark', iterations=1, warmup=0,
+                    allocation_iterations=0, scenario=['recipe-list'],
+                    compare=base.name, stdout=StringIO(),
+                )
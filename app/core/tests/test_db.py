@@ -0,0 +1,80 @@
+"""
+Tests for persistent connection health checks.
+"""
+from unittest.mock import patch
+
+from django.core.signals import request_finished, request_started
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+
+from core.metrics import registry
+
+
+def counter(name):
+    return registry.get(name, alias='default') or 0
+
+
+@override_settings(DB_HEALTH_CHECKS=True, DB_HEALTH_CHECK_INTERVAL=0)
+class ConnectionHealthCheckTests(TransactionTestCase):
+    """Test reused connections are checked when a request starts."""
+
+    def setUp(self):
+        connection.ensure_connection()
+
+    def test_usable_connection_reused(self):
+        """Test a healthy connection is kept and counted as reused."""
+        raw = connection.connection
+        reused = counter('db_connections_reused_total')
+
+        request_started.send(sender=self.__class__)
+
+        self.assertIs(connection.connection, raw)
+        self.assertEqual(
+            counter('db_connections_reused_total'), reused + 1,
+        )
+
+    def test_unusable_connection_replaced(self):
+        """Test a broken connection is closed and a new one opened."""
+        failures = counter('db_connection_health_check_failures_total')
+        created = counter('db_connections_created_total')
+
+        with patch.object(connection, 'is_usable', return_value=False):
+            request_started.send(sender=self.__class__)
+
+        self.assertIsNone(connection.connection)
+        self.assertEqual(
+            counter('db_connection_health_check_failures_total'),
+            failures + 1,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.assertEqual(
+            counter('db_connections_created_total'), created + 1,
+        )
+
+
+@override_settings(DB_HEALTH_CHECKS=True, DB_HEALTH_CHECK_INTERVAL=30)
+class ConnectionHealthCheckIntervalTests(TransactionTestCase):
+    """Test only idle connections are checked with an interval set."""
+
+    def setUp(self):
+        connection.ensure_connection()
+        request_finished.send(sender=self.__class__)
+
+    def test_recently_used_connection_not_checked(self):
+        """Test a connection used by the last request is trusted."""
+        with patch.object(connection, 'is_usable') as is_usable:
+            request_started.send(sender=self.__class__)
+
+        is_usable.assert_not_called()
+
+    def test_idle_connection_checked(self):
+        """Test a connection idle for the interval is checked."""
+        connection.health_checked_at -= 30
+
+        with patch.object(
+            connection, 'is_usable', return_value=True,
+        ) as is_usable:
+            request_started.send(sender=self.__class__)
+
+        is_usable.assert_called_once_with()
@@ -0,0 +1,119 @@
+"""
+Tests for the request instrumentation middleware and metrics.
+"""
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.instrumentation import RequestMetrics
+from core.metrics import registry
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+METRICS_URL = reverse('metrics')
+
+
+class InstrumentationTests(TestCase):
+    """Test per-request instrumentation."""
+
+    def setUp(self):
+        registry.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing_header(self):
+        """Test responses report their database and serializer time."""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        timing = res['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn('serializer;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_repeated_query_shapes_flagged(self):
+        """Test one SQL shape run repeatedly is reported as N+1."""
+        metrics = RequestMetrics()
+        with connection.execute_wrapper(metrics):
+            for pk in range(5):
+                get_user_model().objects.filter(pk=pk).exists()
+            get_user_model().objects.count()
+
+        self.assertEqual(metrics.queries, 6)
+        repeated = metrics.repeated_shapes(5)
+        self.assertEqual(len(repeated), 1)
+        self.assertEqual(repeated[0][1], 5)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint(self):
+        """Test requests are aggregated per view and action."""
+        self.client.get(RECIPES_URL)
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        body = res.content.decode()
+        self.assertIn(
+            'http_requests_total{action="list",status="200",'
+            'view="recipe:recipe-list"} 2',
+            body,
+        )
+        self.assertIn('# TYPE db_queries_per_request histogram', body)
+        self.assertIn('response_cache_misses_total', body)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token_required(self):
+        """Test the metrics endpoint checks the token when configured."""
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_metrics_not_served_without_token(self):
+        """Test the metrics are not public when no token is configured."""
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_metrics_summed_across_workers(self):
+        """Test the files of every worker in METRICS_DIR are summed."""
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir)
+        other = {
+            'http_requests_total': [[
+                [['action', 'list'], ['status', '200'],
+                 ['view', 'recipe:recipe-list']],
+                3,
+            ]],
+        }
+        with open(os.path.join(metrics_dir, 'other.json'), 'w') as f:
+            json.dump(other, f)
+
+        with self.settings(METRICS_DIR=metrics_dir, METRICS_TOKEN='secret'):
+            self.client.get(RECIPES_URL)
+            res = self.client.get(
+                METRICS_URL, HTTP_AUTHORIZATION='Bearer secret',
+            )
+
+        self.assertIn(
+            'http_requests_total{action="list",status="200",'
+            'view="recipe:recipe-list"} 4',
+            res.content.decode(),
+        )
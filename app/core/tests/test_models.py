@@ -1,10 +1,13 @@
 """
 Tests for models.
 """
+import threading
+from unittest import skipUnless
 from unittest.mock import patch
 from decimal import Decimal
 
-from django.test import TestCase
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase
 from django.contrib.auth import get_user_model
 
 from core import models
@@ -90,6 +93,14 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(ingredient), ingredient.name)
 
+    def test_tag_name_unique_per_user(self):
+        """Test a user cannot have two tags with the same name."""
+        user = create_user()
+        models.Tag.objects.create(user=user, name='Tag1')
+
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name='Tag1')
+
     @patch('core.models.uuid.uuid4')
     def test_recipe_file_name_uuid(self, mock_uuid):
         """Test generating image path."""
@@ -97,4 +108,50 @@ class ModelTests(TestCase):
         mock_uuid.return_value = uuid
         file_path = models.recipe_image_file_path(None, 'example.jpg')
 
-        self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
\ No newline at end of file
+        self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
+
+
+@skipUnless(
+    connection.vendor == 'postgresql',
+    'The upsert relies on Postgres ON CONFLICT.',
+)
+class ConcurrentUpsertTests(TransactionTestCase):
+    """Test tag/ingredient upserts under concurrent writers."""
+
+    def test_concurrent_get_or_create_names(self):
+        """Test concurrent upserts of the same names create no duplicates."""
+        user = create_user()
+        names = [f'Tag {i}' for i in range(20)]
+        workers = 8
+        barrier = threading.Barrier(workers)
+        results = []
+        errors = []
+
+        def upsert():
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    objs = models.Tag.objects.get_or_create_names(
+                        user,
+                        reversed(names),
+                    )
+                results.append({name: obj.id for name, obj in objs.items()})
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=upsert) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), workers)
+        expected = dict(
+            models.Tag.objects.filter(user=user).values_list('name', 'id')
+        )
+        self.assertEqual(len(expected), len(names))
+        for result in results:
+            self.assertEqual(result, expected)
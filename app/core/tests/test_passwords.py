@@ -0,0 +1,95 @@
+"""
+Tests for pooled password verification.
+"""
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import authenticate, get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.checks import check_password_pool
+from core.metrics import registry
+from core.passwords import PasswordPool, create_password_pool
+
+
+TOKEN_URL = reverse('user:token')
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class PooledModelBackendTests(TestCase):
+    """Test logins hash passwords in the pool."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+
+    def test_authenticate(self):
+        """Test valid credentials authenticate and invalid ones don't."""
+        user = authenticate(username=self.user.email, password='testpass123')
+        wrong = authenticate(username=self.user.email, password='wrong')
+        unknown = authenticate(username='x@example.com', password='wrong')
+
+        self.assertEqual(user, self.user)
+        self.assertIsNone(wrong)
+        self.assertIsNone(unknown)
+
+    def test_rehash_on_login(self):
+        """Test a hash with old parameters is upgraded on login."""
+        rehashes = registry.get('password_rehashes_total') or 0
+
+        with self.settings(PASSWORD_HASH_ITERATIONS=2000):
+            user = authenticate(
+                username=self.user.email, password='testpass123',
+            )
+
+        self.user.refresh_from_db()
+        self.assertEqual(user, self.user)
+        self.assertIn('$2000$', self.user.password)
+        self.assertTrue(self.user.check_password('testpass123'))
+        self.assertEqual(
+            registry.get('password_rehashes_total'), rehashes + 1,
+        )
+
+    def test_full_pool_returns_503(self):
+        """Test logins are refused while the pool is full."""
+        client = APIClient()
+        payload = {'email': self.user.email, 'password': 'testpass123'}
+
+        with patch('core.passwords.password_pool', PasswordPool(1, 0)):
+            res = client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    @override_settings(PASSWORD_HASH_MAX_PENDING=8, UWSGI_THREADS=2)
+    def test_limit_kept_below_threads(self):
+        """Test a limit at the thread count still leaves a thread free."""
+        pool = create_password_pool()
+        started = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            started.set()
+            release.wait(5)
+
+        holder = threading.Thread(target=pool.run, args=(hold,))
+        holder.start()
+        self.addCleanup(holder.join)
+        self.addCleanup(release.set)
+        started.wait(5)
+
+        client = APIClient()
+        payload = {'email': self.user.email, 'password': 'testpass123'}
+        with patch('core.passwords.password_pool', pool):
+            res = client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(
+            [error.id for error in check_password_pool(None)],
+            ['core.E002'],
+        )
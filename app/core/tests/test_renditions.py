@@ -0,0 +1,121 @@
+"""
+Tests for the image rendition API.
+"""
+import io
+import os
+import shutil
+import tempfile
+
+from PIL import Image
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import renditions
+from core.images import rendition_storage
+
+
+RENDITION_URL = reverse('rendition')
+
+
+def save_image(name, size=(800, 600)):
+    """Save a sample JPEG image to the default storage."""
+    buffer = io.BytesIO()
+    Image.new('RGB', size).save(buffer, format='JPEG')
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+class RenditionApiTests(TestCase):
+    """Test the rendition API."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            IMAGE_RENDITION_WIDTHS=(320, 640),
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.client = APIClient()
+        self.source = save_image('uploads/recipe/sample.jpg')
+
+    def test_rendition_generated_once(self):
+        """Test a rendition is generated and then served from disk."""
+        params = {'path': self.source, 'w': 320, 'fmt': 'webp'}
+        res = self.client.get(RENDITION_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_302_FOUND)
+        name = renditions.rendition_name(self.source, 320, 'webp')
+        self.assertEqual(res['Location'], rendition_storage.url(name))
+        with rendition_storage.open(name) as rendered:
+            self.assertEqual(Image.open(rendered).size, (320, 240))
+
+        mtime = os.stat(rendition_storage.path(name)).st_mtime_ns
+        res = self.client.get(RENDITION_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_302_FOUND)
+        self.assertGreaterEqual(
+            os.stat(rendition_storage.path(name)).st_mtime_ns,
+            mtime,
+        )
+
+    def test_rendition_unsupported_width(self):
+        """Test widths outside the configured set are rejected."""
+        params = {'path': self.source, 'w': 333, 'fmt': 'webp'}
+        res = self.client.get(RENDITION_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rendition_path_outside_uploads(self):
+        """Test sources outside the uploads directory are not served."""
+        params = {'path': '../etc/passwd', 'w': 320, 'fmt': 'webp'}
+        res = self.client.get(RENDITION_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_evict_least_recently_used(self):
+        """Test eviction removes the least recently used renditions."""
+        old = renditions.get_rendition(self.source, 320, 'jpeg')
+        new = renditions.get_rendition(self.source, 640, 'jpeg')
+        old_path = rendition_storage.path(old)
+        new_path = rendition_storage.path(new)
+        os.utime(old_path, (0, 0))
+
+        freed = renditions.evict(os.path.getsize(new_path))
+
+        self.assertGreater(freed, 0)
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(new_path))
+
+    def test_srcset_links_job_renditions(self):
+        """Test widths an image job rendered are not rendered again."""
+        job_renditions = [
+            {'name': 'uploads/recipe/renditions/1/320.webp',
+             'width': 320, 'height': 240, 'format': 'webp'},
+            {'name': 'uploads/recipe/renditions/1/400.webp',
+             'width': 400, 'height': 300, 'format': 'webp'},
+        ]
+        with override_settings(IMAGE_RENDITION_WIDTHS=(320, 640, 1280)):
+            srcset = renditions.build_srcset(
+                self.source, renditions=job_renditions,
+            )
+
+        self.assertEqual(srcset, ', '.join([
+            f"{rendition_storage.url(job_renditions[0]['name'])} 320w",
+            f"{rendition_storage.url(job_renditions[1]['name'])} 400w",
+        ]))
+
+    def test_srcset_renders_missing_widths_on_demand(self):
+        """Test widths without a job rendition use the rendition API."""
+        srcset = renditions.build_srcset(self.source)
+
+        self.assertEqual(srcset, ', '.join(
+            f'{renditions.rendition_url(self.source, width)} {width}w'
+            for width in (320, 640)
+        ))
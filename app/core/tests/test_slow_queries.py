@@ -0,0 +1,124 @@
+"""
+Tests for the slow query log.
+"""
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.slow_queries import fingerprint, read_entries, write_entry
+
+
+class SlowQueryLogTests(TestCase):
+    """Test logging and summarizing slow statements."""
+
+    def setUp(self):
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        self.log_file = os.path.join(log_dir, 'slow.log')
+        override = override_settings(
+            SLOW_QUERY_LOG_FILE=self.log_file,
+            SLOW_QUERY_THRESHOLD_MS=0,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_fingerprint_ignores_literals(self):
+        """Test statements differing only in values share a fingerprint."""
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s) AND a = 1'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s)  AND a = 25'),
+        )
+        self.assertNotEqual(
+            fingerprint('SELECT * FROM t WHERE a = %s'),
+            fingerprint('SELECT * FROM u WHERE a = %s'),
+        )
+
+    def test_slow_query_logged_with_view(self):
+        """Test statements over the threshold are logged with their view."""
+        self.client.get(reverse('recipe:recipe-list'))
+
+        entries = list(read_entries(self.log_file))
+        recipe_entries = [
+            entry for entry in entries if 'core_recipe' in entry['sql']
+        ]
+        self.assertTrue(recipe_entries)
+        self.assertEqual(
+            recipe_entries[0]['view'],
+            'recipe:recipe-list (list)',
+        )
+        self.assertIsNone(recipe_entries[0]['explain'])
+
+    @override_settings(SLOW_QUERY_EXPLAIN=True)
+    def test_explain_captured_for_select(self):
+        """Test a slow SELECT is logged with its analyzed plan."""
+        list(get_user_model().objects.filter(email='user@example.com'))
+
+        plans = [
+            entry['explain'] for entry in read_entries(self.log_file)
+            if entry['sql'].startswith('SELECT') and entry['explain']
+        ]
+        self.assertTrue(plans)
+        self.assertIn('actual time', plans[0])
+
+    def test_command_aggregates_by_fingerprint(self):
+        """Test the command sums calls and time per fingerprint."""
+        log_file = f'{self.log_file}.summary'
+        with override_settings(
+            SLOW_QUERY_LOG_FILE=log_file,
+            SLOW_QUERY_THRESHOLD_MS=10 ** 6,
+        ):
+            for duration in (10, 30):
+                write_entry({
+                    'time': '2026-01-01T00:00:00',
+                    'fingerprint': 'abc',
+                    'duration_ms': duration,
+                    'view': 'recipe:recipe-list (list)',
+                    'sql': 'SELECT ?',
+                    'explain': None,
+                })
+            out = StringIO()
+            call_command('slow_queries', '--json', stdout=out)
+
+        stats = json.loads(out.getvalue())
+        self.assertEqual(stats[0]['fingerprint'], 'abc')
+        self.assertEqual(stats[0]['calls'], 2)
+        self.assertEqual(stats[0]['total_ms'], 40)
+        self.assertEqual(stats[0]['mean_ms'], 20)
+        self.assertEqual(stats[0]['max_ms'], 30)
+
+    def test_read_entries_merges_process_logs(self):
+        """Test the logs every process writes are read together."""
+        entry = {
+            'time': '2026-01-01T00:00:00',
+            'fingerprint': 'abc',
+            'duration_ms': 10,
+            'view': None,
+            'sql': 'SELECT ?',
+            'explain': None,
+        }
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=10 ** 6):
+            write_entry(entry)
+        other_log = os.path.join(os.path.dirname(self.log_file), 'slow.1.log')
+        with open(other_log, 'w') as log_file:
+            log_file.write(json.dumps(dict(entry, fingerprint='def')) + '\n')
+
+        fingerprints = {
+            entry['fingerprint'] for entry in read_entries(self.log_file)
+        }
+
+        self.assertLessEqual({'abc', 'def'}, fingerprints)
@@ -0,0 +1,96 @@
+"""
+Tests for content-addressed media storage.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core.models import MediaBlob, Recipe
+
+
+class ContentAddressedStorageTests(TestCase):
+    """Test deduplicated media storage and its garbage collection."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root)
+        user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.recipes = [
+            Recipe.objects.create(
+                user=user,
+                title=f'Recipe {i}',
+                time_minutes=10,
+                price=Decimal('5.00'),
+            )
+            for i in range(2)
+        ]
+
+    def test_same_content_stored_once(self):
+        """Test identical uploads share one blob."""
+        for recipe in self.recipes:
+            recipe.image.save('photo.JPG', ContentFile(b'same bytes'))
+
+        digest = hashlib.sha256(b'same bytes').hexdigest()
+        self.assertEqual(self.recipes[0].image.name,
+                         self.recipes[1].image.name)
+        self.assertTrue(self.recipes[0].image.name.endswith(f'{digest}.jpg'))
+        blob = MediaBlob.objects.get()
+        self.assertEqual(blob.refcount, 2)
+        self.assertEqual(blob.size, len(b'same bytes'))
+
+    def test_replaced_file_released(self):
+        """Test replacing or deleting a file drops its reference."""
+        recipe = self.recipes[0]
+        recipe.image.save('first.jpg', ContentFile(b'first'))
+        old_name = recipe.image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.image.save('second.jpg', ContentFile(b'second'))
+        self.assertEqual(MediaBlob.objects.get(name=old_name).refcount, 0)
+
+        new_name = recipe.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        self.assertEqual(MediaBlob.objects.get(name=new_name).refcount, 0)
+
+    def test_gc_media_removes_unreferenced_blobs(self):
+        """Test gc_media deletes only blobs nobody references."""
+        self.recipes[0].image.save('kept.jpg', ContentFile(b'kept'))
+        kept = self.recipes[0].image.name
+        unused = default_storage.save('unused.jpg', ContentFile(b'unused'))
+        default_storage.release(unused)
+
+        out = StringIO()
+        call_command('gc_media', '--grace-minutes=0', stdout=out)
+
+        self.assertFalse(MediaBlob.objects.filter(name=unused).exists())
+        self.assertFalse(os.path.exists(default_storage.path(unused)))
+        self.assertTrue(os.path.exists(default_storage.path(kept)))
+        self.assertIn('Removed 1 blobs, 6 bytes.', out.getvalue())
+
+    def test_gc_media_recount(self):
+        """Test --recount repairs counts that drifted from the tables."""
+        self.recipes[0].image.save('photo.jpg', ContentFile(b'photo'))
+        name = self.recipes[0].image.name
+        MediaBlob.objects.filter(name=name).update(refcount=0)
+
+        call_command('gc_media', '--recount', '--grace-minutes=0',
+                     stdout=StringIO())
+
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+        self.assertTrue(os.path.exists(default_storage.path(name)))
@@ -0,0 +1,146 @@
+"""
+Tests for the login and sign-up throttles.
+"""
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.checks import check_login_throttle
+from core.throttling import LocalCounterStore, local_store
+
+
+TOKEN_URL = reverse('user:token')
+JWT_URL = reverse('token_obtain_pair')
+CREATE_USER_URL = reverse('user:create')
+
+
+class LocalCounterStoreTests(SimpleTestCase):
+    """Test the in-process window counters."""
+
+    def test_windows_roll_over(self):
+        """Test counts move to the previous window and then expire."""
+        store = LocalCounterStore(max_keys=10)
+
+        self.assertEqual(store.hit('key', 60, 1), (0, 1))
+        self.assertEqual(store.hit('key', 60, 1), (0, 2))
+        self.assertEqual(store.hit('key', 60, 2), (2, 1))
+        self.assertEqual(store.hit('key', 60, 4), (0, 1))
+
+    def test_bounded(self):
+        """Test the least recently hit keys are evicted."""
+        store = LocalCounterStore(max_keys=2)
+
+        for key in ('a', 'b', 'c'):
+            store.hit(key, 60, 1)
+
+        self.assertEqual(store.hit('a', 60, 1), (0, 1))
+
+
+@override_settings(
+    LOGIN_THROTTLE_ENABLED=True,
+    LOGIN_THROTTLE_STORE='local',
+    PASSWORD_HASH_ITERATIONS=1000,
+    LOGIN_THROTTLE_RATES={
+        'login_ip': '3/hour',
+        'login_email': '2/hour',
+        'signup_ip': '1/hour',
+    },
+)
+class LoginThrottleTests(TestCase):
+    """Test logins and sign-ups are throttled before any work."""
+
+    def setUp(self):
+        local_store.clear()
+        self.addCleanup(local_store.clear)
+        self.client = APIClient()
+
+    def login(self, url, email, address='10.0.0.1'):
+        return self.client.post(
+            url,
+            {'email': email, 'password': 'wrong'},
+            REMOTE_ADDR=address,
+        )
+
+    def test_login_throttled_per_ip(self):
+        """Test an address is throttled without querying the database."""
+        for index in range(3):
+            res = self.login(TOKEN_URL, f'user{index}@example.com')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with self.assertNumQueries(0):
+            res = self.login(TOKEN_URL, 'user3@example.com')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', res)
+
+    def test_forwarded_for_not_trusted(self):
+        """Test a client can't dodge the throttle with X-Forwarded-For."""
+        for index in range(4):
+            res = self.client.post(
+                TOKEN_URL,
+                {'email': f'user{index}@example.com', 'password': 'wrong'},
+                REMOTE_ADDR='10.0.0.1',
+                HTTP_X_FORWARDED_FOR=f'192.0.2.{index}',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_login_throttled_per_email(self):
+        """Test an email is throttled across addresses."""
+        self.login(JWT_URL, 'user@example.com', '10.0.0.1')
+        self.login(JWT_URL, 'user@example.com', '10.0.0.2')
+
+        res = self.login(JWT_URL, 'user@example.com', '10.0.0.3')
+        other = self.login(JWT_URL, 'other@example.com', '10.0.0.3')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(other.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_signup_throttled_per_ip(self):
+        """Test sign-ups are throttled per address."""
+        payload = {
+            'email': 'new@example.com',
+            'password': 'testpass123',
+            'name': 'New User',
+        }
+        res = self.client.post(CREATE_USER_URL, payload)
+        payload['email'] = 'newer@example.com'
+        throttled = self.client.post(CREATE_USER_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            throttled.status_code, status.HTTP_429_TOO_MANY_REQUESTS,
+        )
+
+
+class LoginThrottleCheckTests(SimpleTestCase):
+    """Test the deploy check of the throttle store."""
+
+    @override_settings(
+        LOGIN_THROTTLE_ENABLED=True,
+        LOGIN_THROTTLE_STORE='cache',
+        CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }},
+    )
+    def test_per_process_cache_is_an_error(self):
+        """Test the cache store needs a cache shared by the workers."""
+        errors = check_login_throttle(None)
+
+        self.assertEqual([error.id for error in errors], ['core.E001'])
+
+    @override_settings(
+        LOGIN_THROTTLE_ENABLED=True,
+        LOGIN_THROTTLE_STORE='cache',
+        CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': '/tmp/throttle-check',
+        }},
+    )
+    def test_file_based_cache_is_an_error(self):
+        """Test the cache store needs atomic counters."""
+        errors = check_login_throttle(None)
+
+        self.assertEqual([error.id for error in errors], ['core.E003'])
@@ -0,0 +1,191 @@
+"""
+Tests for the chunked upload API.
+"""
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ChunkedUpload, Recipe
+from core.uploads import temp_path
+
+
+UPLOADS_URL = reverse('core:chunkedupload-list')
+
+
+def detail_url(upload_id):
+    """Create and return an upload detail URL."""
+    return reverse('core:chunkedupload-detail', args=[upload_id])
+
+
+def complete_url(upload_id):
+    """Create and return an upload completion URL."""
+    return reverse('core:chunkedupload-complete', args=[upload_id])
+
+
+def sample_image():
+    """Return the bytes of a sample JPEG image."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (200, 100)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class ChunkedUploadApiTests(TestCase):
+    """Test the chunked upload API."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        override = override_settings(
+            MEDIA_ROOT=os.path.join(self.media_root, 'media'),
+            UPLOAD_TEMP_DIR=os.path.join(self.media_root, 'tmp'),
+            IMAGE_PIPELINE_WORKERS=0,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=Decimal('5.00'),
+        )
+        self.content = sample_image()
+
+    def _create(self, **params):
+        payload = {
+            'target': 'recipe',
+            'object_id': str(self.recipe.id),
+            'filename': 'photo.jpg',
+            'size': len(self.content),
+        }
+        payload.update(params)
+        return self.client.post(UPLOADS_URL, payload, format='json')
+
+    def _put(self, upload_id, start, chunk):
+        end = start + len(chunk) - 1
+        return self.client.put(
+            detail_url(upload_id),
+            chunk,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(self.content)}',
+        )
+
+    def test_chunked_upload_success(self):
+        """Test uploading an image in chunks sets the recipe image."""
+        res = self._create()
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        upload_id = res.data['id']
+
+        middle = len(self.content) // 2
+        self._put(upload_id, 0, self.content[:middle])
+        res = self.client.get(detail_url(upload_id))
+        self.assertEqual(res.data['offset'], middle)
+        self._put(upload_id, middle, self.content[middle:])
+
+        digest = hashlib.sha256(self.content).hexdigest()
+        res = self.client.post(
+            complete_url(upload_id),
+            {'sha256': digest},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['sha256'], digest)
+        self.recipe.refresh_from_db()
+        with self.recipe.image.open('rb') as image_file:
+            self.assertEqual(image_file.read(), self.content)
+
+    def test_chunk_offset_mismatch(self):
+        """Test a chunk not starting at the current offset is rejected."""
+        upload_id = self._create().data['id']
+
+        res = self._put(upload_id, 10, self.content[10:20])
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data['offset'], 0)
+
+    def test_complete_checksum_mismatch(self):
+        """Test completing with a wrong checksum fails."""
+        upload_id = self._create().data['id']
+        self._put(upload_id, 0, self.content)
+
+        res = self.client.post(
+            complete_url(upload_id),
+            {'sha256': '0' * 64},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        upload = ChunkedUpload.objects.get(id=upload_id)
+        self.assertEqual(upload.status, ChunkedUpload.Status.UPLOADING)
+
+    def test_upload_other_users_recipe_error(self):
+        """Test uploading to another user's recipe is rejected."""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        self.recipe.user = other
+        self.recipe.save()
+
+        res = self._create()
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_invalid_object_id_error(self):
+        """Test an object_id that is not a primary key is rejected."""
+        res = self._create(object_id='abc')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('object_id', res.data)
+
+    def test_partial_upload_not_under_media_root(self):
+        """Test partial uploads are kept outside the served media."""
+        upload_id = self._create().data['id']
+        self._put(upload_id, 0, self.content[:10])
+
+        path = temp_path(ChunkedUpload.objects.get(id=upload_id))
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(path.startswith(settings.MEDIA_ROOT))
+
+    def test_gc_media_expires_unfinished_uploads(self):
+        """Test gc_media deletes uploads abandoned before completion."""
+        stale_id = self._create().data['id']
+        self._put(stale_id, 0, self.content[:10])
+        fresh_id = self._create().data['id']
+        self._put(fresh_id, 0, self.content[:10])
+        stale = ChunkedUpload.objects.get(id=stale_id)
+        ChunkedUpload.objects.filter(id=stale_id).update(
+            updated_at=timezone.now() - timedelta(hours=2),
+        )
+        os.utime(temp_path(stale), (0, 0))
+
+        call_command(
+            'gc_media', '--upload-expiry-hours=1', stdout=io.StringIO(),
+        )
+
+        self.assertFalse(ChunkedUpload.objects.filter(id=stale_id).exists())
+        self.assertFalse(os.path.exists(temp_path(stale)))
+        fresh = ChunkedUpload.objects.get(id=fresh_id)
+        self.assertTrue(os.path.exists(temp_path(fresh)))
@@ -0,0 +1,178 @@
+"""
+Sliding-window throttles for the login and sign-up endpoints.
+
+Each throttle keeps two fixed-window counters per key, the current and
+the previous window, and estimates the requests of the last full window
+as the current count plus the previous count weighted by how much of the
+previous window still overlaps it. A check is one counter increment and
+one read, in process memory (LOGIN_THROTTLE_STORE = 'local') or in the
+default cache (LOGIN_THROTTLE_STORE = 'cache'), which must be shared
+between workers for the limits to hold; a deploy check enforces it.
+Client addresses come from DRF's get_ident(), so X-Forwarded-For is
+only trusted as far as REST_FRAMEWORK['NUM_PROXIES'] allows.
+
+Throttles run before the request body reaches a serializer, so throttled
+logins never query a user or hash a password. Rejected requests count
+too, so a client that keeps retrying stays throttled.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from rest_framework.throttling import BaseThrottle
+
+from core.metrics import registry
+
+
+registry.describe(
+    'login_throttled_total', 'counter',
+    'Requests rejected by the login and sign-up throttles.',
+)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """Return (requests, seconds) of a rate such as '5/min'."""
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+class LocalCounterStore:
+    """Window counters in process memory, bounded to max_keys keys."""
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._counters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, window, index):
+        """Count a hit in window number index of key.
+
+        Returns the counts of the previous and the current window.
+        """
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None or counter[0] < index - 1:
+                previous, current = 0, 0
+            elif counter[0] == index - 1:
+                previous, current = counter[2], 0
+            else:
+                previous, current = counter[1], counter[2]
+            current += 1
+            self._counters[key] = (index, previous, current)
+            self._counters.move_to_end(key)
+            while len(self._counters) > self.max_keys:
+                self._counters.popitem(last=False)
+        return previous, current
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+
+
+class CacheCounterStore:
+    """Window counters in the default cache."""
+
+    def hit(self, key, window, index):
+        """Count a hit in window number index of key.
+
+        Returns the counts of the previous and the current window.
+        """
+        current_key = f'throttle:{key}:{index}'
+        cache.add(current_key, 0, timeout=window * 2)
+        try:
+            current = cache.incr(current_key)
+        except ValueError:
+            # Evicted between add() and incr().
+            cache.set(current_key, 1, timeout=window * 2)
+            current = 1
+        previous = cache.get(f'throttle:{key}:{index - 1}', 0)
+        return previous, current
+
+
+local_store = LocalCounterStore(settings.LOGIN_THROTTLE_LOCAL_MAX_KEYS)
+cache_store = CacheCounterStore()
+
+
+def get_store():
+    """Return the counter store selected by LOGIN_THROTTLE_STORE."""
+    if settings.LOGIN_THROTTLE_STORE == 'local':
+        return local_store
+    return cache_store
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """Throttle requests per key at the LOGIN_THROTTLE_RATES[scope] rate.
+
+    Subclasses set scope and return the key of a request from get_key(),
+    or None to leave it unthrottled.
+    """
+    scope = None
+
+    def get_key(self, request, view):
+        raise NotImplementedError('.get_key() must be overridden')
+
+    def allow_request(self, request, view):
+        if not settings.LOGIN_THROTTLE_ENABLED:
+            return True
+        rate = settings.LOGIN_THROTTLE_RATES.get(self.scope)
+        if rate is None:
+            return True
+        key = self.get_key(request, view)
+        if key is None:
+            return True
+
+        num_requests, window = parse_rate(rate)
+        index, elapsed = divmod(time.time(), window)
+        previous, current = get_store().hit(
+            f'{self.scope}:{key}', window, int(index),
+        )
+        overlap = 1 - elapsed / window
+        if previous * overlap + current <= num_requests:
+            return True
+
+        if previous and current < num_requests:
+            # Until enough of the previous window has slid out.
+            needed = window * (1 - (num_requests - current) / previous)
+            self.retry_after = max(needed - elapsed, 0)
+        else:
+            self.retry_after = window - elapsed
+        registry.inc('login_throttled_total', scope=self.scope)
+        return False
+
+    def wait(self):
+        return self.retry_after
+
+
+class LoginIPThrottle(SlidingWindowThrottle):
+    """Throttle login attempts per client address."""
+    scope = 'login_ip'
+
+    def get_key(self, request, view):
+        return self.get_ident(request)
+
+
+class LoginEmailThrottle(SlidingWindowThrottle):
+    """Throttle login attempts per submitted email address."""
+    scope = 'login_email'
+
+    def get_key(self, request, view):
+        data = request.data
+        email = data.get('email') if hasattr(data, 'get') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        # Hashed to keep cache keys short and free of odd characters.
+        return hashlib.sha1(email.strip().lower().encode()).hexdigest()
+
+
+class SignupIPThrottle(SlidingWindowThrottle):
+    """Throttle account creation per client address."""
+    scope = 'signup_ip'
+
+    def get_key(self, request, view):
+        return self.get_ident(request)
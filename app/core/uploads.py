@@ -0,0 +1,161 @@
+"""
+Resumable chunked uploads written straight to disk.
+
+Chunks are appended to a temporary file in UPLOAD_TEMP_DIR, outside the
+served MEDIA_ROOT, while a SHA-256 is updated incrementally, so a worker
+never holds more than one read buffer of the upload in memory. On
+completion the file is verified and atomically renamed into place.
+Uploads left unfinished for UPLOAD_EXPIRY_HOURS are removed by gc_media.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+
+READ_SIZE = 64 * 1024
+
+# Upload targets clients may name: target -> (model label, file field).
+UPLOAD_TARGETS = {
+    'recipe': ('core.Recipe', 'image'),
+    'photo': ('book.Photo', 'image'),
+}
+
+
+class UploadError(Exception):
+    """Raised when a chunk or a completed upload is rejected."""
+
+
+class OffsetMismatch(UploadError):
+    """Raised when a chunk does not start at the current upload offset."""
+
+
+# Per-process hash state: upload id -> (offset, hasher, last use), least
+# recently used first. A worker that did not see the earlier chunks
+# rebuilds the state from the file on disk.
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+def get_target_model(target):
+    """Return the model of an upload target, or None if unavailable."""
+    if target not in UPLOAD_TARGETS:
+        return None
+    label, _ = UPLOAD_TARGETS[target]
+    try:
+        return apps.get_model(label)
+    except LookupError:
+        return None
+
+
+def temp_path(upload):
+    """Return the path of the partial file of upload."""
+    return os.path.join(settings.UPLOAD_TEMP_DIR, f'{upload.pk}.part')
+
+
+def _take_hasher(upload):
+    """Return the hash state of upload at its current offset."""
+    with _hashers_lock:
+        offset, hasher, _ = _hashers.pop(upload.pk, (None, None, None))
+    if offset == upload.offset:
+        return hasher
+
+    hasher = hashlib.sha256()
+    remaining = upload.offset
+    if remaining:
+        with open(temp_path(upload), 'rb') as part:
+            while remaining:
+                data = part.read(min(READ_SIZE, remaining))
+                if not data:
+                    raise UploadError('Partial upload is missing data.')
+                hasher.update(data)
+                remaining -= len(data)
+    return hasher
+
+
+def append_chunk(upload, stream, start):
+    """Append the chunk read from stream at offset start to upload.
+
+    The caller must hold a row lock on upload.
+    """
+    if start != upload.offset:
+        raise OffsetMismatch(f'Expected offset {upload.offset}.')
+
+    path = temp_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    hasher = _take_hasher(upload)
+    written = 0
+    with open(path, 'r+b' if os.path.exists(path) else 'wb') as part:
+        # Drop whatever a failed earlier attempt left past the offset.
+        part.seek(upload.offset)
+        part.truncate()
+        while True:
+            data = stream.read(READ_SIZE)
+            if not data:
+                break
+            written += len(data)
+            if written > settings.UPLOAD_CHUNK_MAX_BYTES:
+                raise UploadError('Chunk is too large.')
+            if upload.size is not None and \
+                    upload.offset + written > upload.size:
+                raise UploadError('Upload is larger than declared.')
+            part.write(data)
+            hasher.update(data)
+
+    upload.offset += written
+    upload.save(update_fields=['offset', 'updated_at'])
+    _put_hasher(upload, hasher)
+    return written
+
+
+def _put_hasher(upload, hasher):
+    """Keep the hash state of upload, dropping states of expired uploads."""
+    now = time.monotonic()
+    max_age = settings.UPLOAD_EXPIRY_HOURS * 3600
+    with _hashers_lock:
+        _hashers[upload.pk] = (upload.offset, hasher, now)
+        while now - next(iter(_hashers.values()))[2] > max_age:
+            _hashers.popitem(last=False)
+
+
+def complete_upload(upload, expected_sha256=''):
+    """Verify upload and move it into its target's file field."""
+    if upload.size is not None and upload.offset != upload.size:
+        raise UploadError('Upload is incomplete.')
+
+    path = temp_path(upload)
+    digest = _take_hasher(upload).hexdigest()
+    if expected_sha256 and expected_sha256.lower() != digest:
+        raise UploadError('Checksum does not match.')
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except Exception as exc:
+        raise UploadError('Upload is not a valid image.') from exc
+
+    target = upload.content_object
+    field = target._meta.get_field(upload.field_name)
+    name = field.generate_filename(target, upload.filename)
+    if hasattr(default_storage, 'adopt'):
+        # The digest is already known, so the blob store takes the file
+        # without reading it again.
+        name = default_storage.adopt(path, digest, name)
+    else:
+        name = default_storage.get_available_name(name)
+        final_path = default_storage.path(name)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(path, final_path)
+
+    setattr(target, field.attname, name)
+    target.save(update_fields=[field.attname])
+    upload.sha256 = digest
+    upload.status = upload.Status.COMPLETE
+    upload.save(update_fields=['sha256', 'status', 'updated_at'])
+    return target
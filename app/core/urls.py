@@ -0,0 +1,16 @@
+""" URL mappings for the core API."""
+
+from django.urls import (
+    path,
+    include,
+)
+from rest_framework.routers import DefaultRouter
+from core import views
+
+
+router = DefaultRouter()
+router.register('uploads', views.ChunkedUploadViewSet)
+app_name = 'core'
+urlpatterns = [
+    path('', include(router.urls)),
+]
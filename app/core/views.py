@@ -1,11 +1,181 @@
 """
 Core views for app.
 """
-from rest_framework.decorators import api_view
+import io
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseRedirect
+from django.utils.crypto import constant_time_compare
+
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from core import uploads
+from core.authentication import CachedTokenAuthentication
+from core.images import can_encode, enqueue_image_job, rendition_storage
+from core.metrics import registry
+from core.models import ChunkedUpload, ImageJob, Recipe
+from core.renditions import get_rendition, is_valid_source
+from core.serializers import ChunkedUploadSerializer
+
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-\d+/(?:\d+|\*)$')
+
 
 @api_view(['GET'])
 def health_check(request):
     """Returns successful response."""
-    return Response({'healthy': True})
\ No newline at end of file
+    return Response({'healthy': True})
+
+
+def metrics(request):
+    """Serve the aggregated request metrics in Prometheus text format.
+
+    Scrapers must send METRICS_TOKEN as a bearer token. Without a token
+    the metrics are only served with DEBUG on.
+    """
+    token = settings.METRICS_TOKEN
+    if not token and not settings.DEBUG:
+        return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+    if token and not constant_time_compare(
+        request.headers.get('Authorization', ''),
+        f'Bearer {token}',
+    ):
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def rendition(request):
+    """Redirect to a resized rendition of an uploaded image.
+
+    The rendition is generated on first request and then served from the
+    media directory by the web server.
+    """
+    source = request.query_params.get('path', '')
+    # Not 'format', which DRF reads as the response format override.
+    fmt = request.query_params.get('fmt', 'webp')
+    try:
+        width = int(request.query_params.get('w', ''))
+    except ValueError:
+        width = None
+
+    if width not in settings.IMAGE_RENDITION_WIDTHS or not can_encode(fmt):
+        return Response(
+            {'error': 'Unsupported rendition width or format.'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if not is_valid_source(source):
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    name = get_rendition(source, width, fmt)
+    response = HttpResponseRedirect(rendition_storage.url(name))
+    response['Cache-Control'] = 'public, max-age=86400'
+    return response
+
+
+class ChunkedUploadViewSet(mixins.CreateModelMixin,
+                           mixins.RetrieveModelMixin,
+                           viewsets.GenericViewSet):
+    """Resumable chunked uploads of images.
+
+    Create an upload, PUT the raw bytes in chunks (with a Content-Range
+    header giving each chunk's start), then POST to complete it. GET
+    returns the current offset to resume from after an interruption.
+    """
+    serializer_class = ChunkedUploadSerializer
+    queryset = ChunkedUpload.objects.all()
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        """Filter queryset to authenticated user."""
+        return self.queryset.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        """Create a new upload."""
+        serializer.save(user=self.request.user)
+
+    def update(self, request, pk=None):
+        """Append a chunk read straight from the request body."""
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if content_length > settings.UPLOAD_CHUNK_MAX_BYTES:
+            return Response(
+                {'error': 'Chunk is too large.'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+
+        with transaction.atomic():
+            upload = self.get_queryset().select_for_update().get(
+                pk=self.get_object().pk,
+            )
+            if upload.status != ChunkedUpload.Status.UPLOADING:
+                return Response(
+                    {'error': 'Upload is already complete.'},
+                    status=status.HTTP_409_CONFLICT,
+                )
+
+            start = upload.offset
+            match = CONTENT_RANGE_RE.match(
+                request.META.get('HTTP_CONTENT_RANGE', '')
+            )
+            if match:
+                start = int(match.group(1))
+            try:
+                uploads.append_chunk(
+                    upload,
+                    request.stream or io.BytesIO(),
+                    start,
+                )
+            except uploads.OffsetMismatch:
+                return Response(
+                    {'offset': upload.offset},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            except uploads.UploadError as exc:
+                return Response(
+                    {'error': str(exc)},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        return Response(self.get_serializer(upload).data)
+
+    @action(methods=['POST'], detail=True)
+    def complete(self, request, pk=None):
+        """Verify the upload and move it into place."""
+        with transaction.atomic():
+            upload = self.get_queryset().select_for_update().get(
+                pk=self.get_object().pk,
+            )
+            if upload.status != ChunkedUpload.Status.UPLOADING:
+                return Response(
+                    {'error': 'Upload is already complete.'},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            try:
+                target = uploads.complete_upload(
+                    upload,
+                    request.data.get('sha256', ''),
+                )
+            except uploads.UploadError as exc:
+                return Response(
+                    {'error': str(exc)},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            if isinstance(target, Recipe):
+                job = ImageJob.objects.create(
+                    recipe=target,
+                    source=target.image.name,
+                )
+                enqueue_image_job(job)
+
+        return Response(self.get_serializer(upload).data)
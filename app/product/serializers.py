@@ -1,8 +1,12 @@
 from rest_framework import serializers
 from django.utils.translation import gettext_lazy as _
+from core.fieldsets import SparseFieldsetMixin
+from core.instrumentation import TimedSerializerMixin
 from core.models import Product
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin,
+                        TimedSerializerMixin,
+                        serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'name', 'description','price']
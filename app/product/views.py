@@ -12,22 +12,62 @@ from rest_framework import (
 )
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from django.utils.translation import gettext as _
 from django.utils.translation import activate
+from core.authentication import CachedTokenAuthentication
+from core.cache import ConditionalGetMixin
+from core.fieldsets import FIELDSET_PARAMETERS, SparseQuerysetMixin
 from core.models import Product
+from core.pagination import CursorPaginationMixin, ProductCursorPagination
 from product import serializers
 
-class ProductViewSet(viewsets.ModelViewSet):
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'pagination',
+                OpenApiTypes.STR, enum=['cursor'],
+                description=(
+                    'Use cursor (keyset) pagination instead of offsets.'
+                ),
+            ),
+            OpenApiParameter(
+                'cursor',
+                OpenApiTypes.STR,
+                description=(
+                    'Opaque cursor returned by the previous cursor page.'
+                ),
+            ),
+            *FIELDSET_PARAMETERS,
+        ]
+    ),
+    retrieve=extend_schema(parameters=FIELDSET_PARAMETERS),
+)
+class ProductViewSet(ConditionalGetMixin,
+                     CursorPaginationMixin,
+                     SparseQuerysetMixin,
+                     viewsets.ModelViewSet):
     """View for manage recipe APIs."""
     serializer_class = serializers.ProductSerializer
     queryset = Product.objects.all()
-    authentication_classes = [TokenAuthentication]
+    cursor_pagination_class = ProductCursorPagination
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
     
 
+    def get_cache_scope(self):
+        """Products are shared, so all users share one generation."""
+        return 'product'
+
+    def get_queryset(self):
+        """Retrieve products, fetching only the requested fields."""
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = self.prune_queryset(queryset)
+        return queryset
+
     def get_serializer_class(self):
         """Return the serializer class for request."""
         if self.action == 'list':
@@ -44,7 +84,7 @@ class BaseProductAttrViewSet(mixins.DestroyModelMixin,
                             mixins.ListModelMixin,
                             viewsets.GenericViewSet):
     """Base viewset for product  attributes."""
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
 class ChangeLanguageView(APIView):
@@ -0,0 +1,162 @@
+"""
+Bulk import and streaming export of recipes as JSON Lines.
+
+Imports are validated row by row, then written a batch at a time: one
+transaction per batch, with every tag and ingredient name of the batch
+resolved in one upsert and the recipes and their links bulk inserted.
+Exports walk the queryset with a server-side cursor and fetch the tags
+and ingredients of each batch in one query apiece, so memory use does not
+grow with the number of recipes.
+"""
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from core.cache import invalidate_scope
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from recipe.queries import related_names
+
+
+EXPORT_FIELDS = [
+    'id', 'title', 'time_minutes', 'price', 'link', 'description',
+]
+
+
+class NDJSONParser(BaseParser):
+    """Parse a JSON Lines body lazily into (row number, value) pairs.
+
+    Values that are not valid JSON are returned as ParseError instances,
+    so a bad row is reported without aborting the whole import.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return self._iter_rows(stream)
+
+    def _iter_rows(self, stream):
+        for row, line in enumerate(iter(stream.readline, b''), start=1):
+            if not line.strip():
+                continue
+            try:
+                yield row, json.loads(line)
+            except ValueError as exc:
+                yield row, ParseError(f'JSON parse error - {exc}')
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _link(through, column, recipes, objs, items_per_recipe):
+    """Bulk insert the links of recipes to the objects they name."""
+    links = []
+    for recipe, items in zip(recipes, items_per_recipe):
+        for name in dict.fromkeys(item['name'] for item in items):
+            links.append(through(
+                recipe_id=recipe.pk,
+                **{column: objs[name].pk},
+            ))
+    through.objects.bulk_create(links)
+
+
+def _write_batch(user, rows):
+    """Create the validated recipes of rows in a single transaction."""
+    tags = [data.pop('tags', []) for _, data in rows]
+    ingredients = [data.pop('ingredients', []) for _, data in rows]
+    with transaction.atomic():
+        tag_objs = Tag.objects.get_or_create_names(
+            user,
+            [item['name'] for items in tags for item in items],
+        )
+        ingredient_objs = Ingredient.objects.get_or_create_names(
+            user,
+            [item['name'] for items in ingredients for item in items],
+        )
+        recipes = Recipe.objects.bulk_create(
+            [Recipe(user=user, **data) for _, data in rows]
+        )
+        _link(Recipe.tags.through, 'tag_id', recipes, tag_objs, tags)
+        _link(
+            Recipe.ingredients.through, 'ingredient_id', recipes,
+            ingredient_objs, ingredients,
+        )
+        # bulk_create sends no model signals, so invalidate here.
+        invalidate_scope(f'user:{user.pk}')
+    return [
+        {'row': row, 'id': recipe.pk}
+        for (row, _), recipe in zip(rows, recipes)
+    ]
+
+
+def import_recipes(rows, serializer):
+    """Validate and create recipes from (row number, data) pairs.
+
+    serializer is an unbound recipe serializer whose context carries the
+    request; it validates every row in turn. Returns one result per row,
+    holding either the new recipe id or the validation errors.
+    """
+    user = serializer.context['request'].user
+    max_rows = settings.RECIPE_BULK_MAX_ROWS
+    results = []
+    seen = 0
+    for batch in _batches(rows, settings.RECIPE_BULK_BATCH_SIZE):
+        valid = []
+        for row, data in batch:
+            seen += 1
+            if seen > max_rows:
+                # Earlier batches are committed; report where reading
+                # stopped rather than failing the whole request.
+                results.append({
+                    'row': row,
+                    'errors': [f'At most {max_rows} rows can be imported.'],
+                })
+                break
+            if isinstance(data, ParseError):
+                results.append({'row': row, 'errors': [data.detail]})
+                continue
+            try:
+                valid.append((row, serializer.run_validation(data)))
+            except serializers.ValidationError as exc:
+                results.append({'row': row, 'errors': exc.detail})
+        if valid:
+            results.extend(_write_batch(user, valid))
+        if seen > max_rows:
+            break
+    results.sort(key=lambda result: result['row'])
+    return results
+
+
+def export_recipes(queryset):
+    """Yield the recipes of queryset as JSON Lines, a batch at a time."""
+    batch_size = settings.RECIPE_BULK_BATCH_SIZE
+    rows = queryset.values(*EXPORT_FIELDS).iterator(chunk_size=batch_size)
+    encoder = DjangoJSONEncoder()
+    for batch in _batches(rows, batch_size):
+        ids = [recipe['id'] for recipe in batch]
+        tags = related_names(Recipe.tags.through, 'tag', ids)
+        ingredients = related_names(
+            Recipe.ingredients.through, 'ingredient', ids,
+        )
+        lines = []
+        for recipe in batch:
+            recipe['tags'] = tags[recipe['id']]
+            recipe['ingredients'] = ingredients[recipe['id']]
+            lines.append(encoder.encode(recipe))
+        yield '\n'.join(lines) + '\n'
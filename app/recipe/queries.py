@@ -0,0 +1,19 @@
+"""
+Queries shared by the recipe list reader and the bulk export.
+"""
+from collections import defaultdict
+
+
+def related_names(through, field, recipe_ids):
+    """Return {recipe id: [{id, name}]} for the links of recipe_ids.
+
+    The links of a recipe are ordered by the id of the linked object.
+    Recipes without links map to an empty list.
+    """
+    related = defaultdict(list)
+    links = through.objects.filter(recipe_id__in=recipe_ids).values_list(
+        'recipe_id', f'{field}_id', f'{field}__name',
+    ).order_by(f'{field}_id')
+    for recipe_id, pk, name in links:
+        related[recipe_id].append({'id': pk, 'name': name})
+    return related
@@ -1,16 +1,45 @@
 """
 Serializers for recipe APIs
 """
+from django.db import transaction
+from django.urls import reverse
+from django.utils.translation import gettext_lazy as _
+
 from rest_framework import serializers
 
+from core.fieldsets import SparseFieldsetMixin
+from core.images import completed_renditions, rendition_storage
+from core.instrumentation import TimedSerializerMixin
+from core.renditions import build_srcset
 from core.models import (
+    ImageJob,
     Recipe,
     Tag,
     Ingredient,
 )
+from recipe.queries import related_names
+
+
+class RecipeAttrSerializer(TimedSerializerMixin,
+                           serializers.ModelSerializer):
+    """Base serializer for tags and ingredients."""
+
+    def validate_name(self, value):
+        """Reject renaming onto a name the user already has."""
+        if self.instance is None:
+            return value
+        duplicate = type(self.instance).objects.filter(
+            user=self.instance.user,
+            name=value,
+        ).exclude(pk=self.instance.pk)
+        if duplicate.exists():
+            raise serializers.ValidationError(
+                _('An item with this name already exists.')
+            )
+        return value
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(RecipeAttrSerializer):
     """Serializer for ingredients."""
 
     class Meta:
@@ -19,7 +48,7 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(RecipeAttrSerializer):
     """Serializer for tags."""
 
     class Meta:
@@ -28,7 +57,9 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsetMixin,
+                       TimedSerializerMixin,
+                       serializers.ModelSerializer):
     """Serializer for recipes."""
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
@@ -40,67 +71,172 @@ class RecipeSerializer(serializers.ModelSerializer):
             'ingredients',
         ]
         read_only_fields = ['id']
+        expandable_fields = ['tags', 'ingredients']
+
+    def _get_or_create_objects(self, model, items):
+        """Return objects for items by name, creating missing ones in bulk."""
+        names = list(dict.fromkeys(item['name'] for item in items))
+        objs = model.objects.get_or_create_names(
+            self.context['request'].user,
+            names,
+        )
+        return [objs[name] for name in names]
 
     def _get_or_create_tags(self, tags, recipe):
         """Handle getting or creating tags as needed."""
-        auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_obj)
+        recipe.tags.add(*self._get_or_create_objects(Tag, tags))
 
     def _get_or_create_ingredients(self, ingredients, recipe):
         """Handle getting or creating ingredients as needed."""
-        auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,
-            )
-            recipe.ingredients.add(ingredient_obj)
+        recipe.ingredients.add(
+            *self._get_or_create_objects(Ingredient, ingredients)
+        )
 
     def create(self, validated_data):
         """Create a recipe."""
         tags = validated_data.pop('tags', [])
         ingredients = validated_data.pop('ingredients', [])
-        recipe = Recipe.objects.create(**validated_data)
-        self._get_or_create_tags(tags, recipe)
-        self._get_or_create_ingredients(ingredients, recipe)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            self._get_or_create_tags(tags, recipe)
+            self._get_or_create_ingredients(ingredients, recipe)
 
         return recipe
 
     def update(self, instance, validated_data):
-        """Update recipe."""
+        """Update recipe, touching only the changed tag/ingredient links."""
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
-        if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
-        if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+        with transaction.atomic():
+            if tags is not None:
+                instance.tags.set(self._get_or_create_objects(Tag, tags))
+            if ingredients is not None:
+                instance.ingredients.set(
+                    self._get_or_create_objects(Ingredient, ingredients)
+                )
+
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+
+            instance.save()
+        return instance
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
 
-        instance.save()
-        return instance
+class RecipeListReader(TimedSerializerMixin):
+    """Build the RecipeSerializer(many=True) output of a list page.
+
+    Not a serializer: it only takes the values() rows of a page and
+    exposes .data. The representation is built with one query per
+    relation, without instantiating serializers and fields per recipe.
+    Scalar values go through the RecipeSerializer fields' own
+    to_representation, so the output stays identical. No field needs
+    the request, so there is no serializer context.
+    """
+    columns = ['id', 'title', 'time_minutes', 'price', 'link']
+    relations = [('tags', 'tag'), ('ingredients', 'ingredient')]
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @property
+    def data(self):
+        return self._timed(self._represent, self.rows)
+
+    def _represent(self, rows):
+        rows = list(rows)
+        fields = RecipeSerializer().fields
+        scalars = [
+            (name, fields[name].to_representation) for name in self.columns
+        ]
+        ids = [row['id'] for row in rows]
+        related = [
+            (name, related_names(getattr(Recipe, name).through, field, ids))
+            for name, field in self.relations
+        ]
+        data = []
+        for row in rows:
+            item = {
+                name: None if row[name] is None else represent(row[name])
+                for name, represent in scalars
+            }
+            for name, items in related:
+                item[name] = items.get(row['id'], [])
+            data.append(item)
+        return data
+
+
+class RecipeBulkSerializer(RecipeSerializer):
+    """Serializer validating the rows of a bulk recipe import."""
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['description']
 
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe detail view."""
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description','image']
+        fields = RecipeSerializer.Meta.fields + [
+            'description', 'image', 'image_srcset',
+        ]
+        fieldset_sources = {'image_srcset': ['image']}
 
+    def get_image_srcset(self, recipe) -> str:
+        """Return srcset-style URLs of the resized recipe image."""
+        return build_srcset(
+            recipe.image.name,
+            request=self.context.get('request'),
+            renditions=completed_renditions(recipe),
+        )
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+
+class RecipeImageSerializer(TimedSerializerMixin,
+                            serializers.ModelSerializer):
     """Serializer for uploading images to recipes."""
 
     class Meta:
         model = Recipe
         fields = ['id', 'image']
         read_only_fields = ['id']
-        extra_kwargs = {'image': {'required': 'True'}}
\ No newline at end of file
+        extra_kwargs = {'image': {'required': 'True'}}
+
+
+class ImageJobSerializer(TimedSerializerMixin,
+                         serializers.ModelSerializer):
+    """Serializer for the processing status of an uploaded recipe image."""
+    image = serializers.SerializerMethodField()
+    renditions = serializers.SerializerMethodField()
+    status_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImageJob
+        fields = [
+            'id', 'recipe', 'status', 'error', 'image', 'renditions',
+            'status_url', 'created_at', 'updated_at',
+        ]
+        read_only_fields = fields
+
+    def _absolute(self, url):
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_image(self, job) -> str:
+        return self._absolute(rendition_storage.url(job.source))
+
+    def get_renditions(self, job) -> list:
+        return [
+            {
+                'url': self._absolute(rendition_storage.url(item['name'])),
+                'width': item['width'],
+                'height': item['height'],
+                'format': item['format'],
+            }
+            for item in job.renditions
+        ]
+
+    def get_status_url(self, job) -> str:
+        return self._absolute(reverse(
+            'recipe:recipe-image-job',
+            args=[job.recipe_id, job.id],
+        ))
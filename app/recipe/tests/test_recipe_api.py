@@ -2,19 +2,26 @@
 Tests for recipe APIs.
 """
 from decimal import Decimal
+import json
 import tempfile
 import os
+from unittest.mock import patch
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core.cache import stats as cache_stats
+from core.images import can_encode, job_rendition_dir, rendition_storage
 from core.models import (
+    ImageJob,
     Recipe,
     Tag,
     Ingredient,
@@ -27,6 +34,8 @@ from recipe.serializers import (
 
 
 RECIPES_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk-import')
+EXPORT_URL = reverse('recipe:recipe-export')
 
 
 def detail_url(recipe_id):
@@ -105,6 +114,99 @@ class PrivateRecipeApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
+    def test_list_recipes_query_count_independent_of_page_size(self):
+        """Test listing recipes costs a fixed number of queries."""
+        def list_with(count):
+            user = create_user(email=f'user{count}@example.com')
+            self.client.force_authenticate(user)
+            for i in range(count):
+                recipe = create_recipe(user=user, title=f'Recipe {i}')
+                recipe.tags.create(user=user, name=f'Tag {i}')
+                recipe.ingredients.create(user=user, name=f'Ingredient {i}')
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.get(RECIPES_URL)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(list_with(2), list_with(20))
+
+    def test_list_recipes_cursor_pagination(self):
+        """Test cursor pagination walks recipes newest first without count."""
+        recipes = [
+            create_recipe(user=self.user, title=f'Recipe {i}')
+            for i in range(3)
+        ]
+
+        params = {'pagination': 'cursor', 'page_size': 2}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', res.data)
+        self.assertEqual(
+            [item['id'] for item in res.data['results']],
+            [recipes[2].id, recipes[1].id],
+        )
+
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual(
+            [item['id'] for item in res.data['results']],
+            [recipes[0].id],
+        )
+        self.assertIsNone(res.data['next'])
+
+    @override_settings(RESPONSE_CACHE_ENABLED=True)
+    def test_list_recipes_cached_until_write(self):
+        """Test list responses are cached and invalidated by writes."""
+        create_recipe(user=self.user, title='First')
+        hits = cache_stats.hits
+
+        res1 = self.client.get(RECIPES_URL)
+        res2 = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res1.data, res2.data)
+        self.assertEqual(cache_stats.hits, hits + 1)
+
+        payload = {
+            'title': 'Second',
+            'time_minutes': 10,
+            'price': Decimal('1.00'),
+        }
+        self.client.post(RECIPES_URL, payload)
+        res3 = self.client.get(RECIPES_URL)
+
+        self.assertEqual(cache_stats.hits, hits + 1)
+        self.assertNotEqual(res3.data, res1.data)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=True)
+    def test_list_recipes_cache_invalidated_by_model_writes(self):
+        """Test writes outside the API, e.g. the admin, drop the cache."""
+        recipe = create_recipe(user=self.user, title='First')
+        self.client.get(RECIPES_URL)
+        hits = cache_stats.hits
+
+        recipe.title = 'Renamed'
+        recipe.save()
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(cache_stats.hits, hits)
+        self.assertEqual(res.data['results'][0]['title'], 'Renamed')
+
+    @patch('core.cache.bump_generation')
+    def test_create_recipe_bumps_generation_once(self, mock_bump):
+        """Test one write with tags bumps the user generation once."""
+        payload = {
+            'title': 'Curry',
+            'time_minutes': 30,
+            'price': Decimal('2.50'),
+            'tags': [{'name': 'Indian'}, {'name': 'Dinner'}],
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        mock_bump.assert_called_once_with(f'user:{self.user.pk}')
+
     def test_get_recipe_detail(self):
         """Test get recipe detail."""
         recipe = create_recipe(user=self.user)
@@ -115,6 +217,98 @@ class PrivateRecipeApiTests(TestCase):
         serializer = RecipeDetailSerializer(recipe)
         self.assertEqual(res.data, serializer.data)
 
+    def test_get_recipe_detail_not_modified(self):
+        """Test If-None-Match returns 304 until the recipe changes."""
+        recipe = create_recipe(user=self.user)
+        url = detail_url(recipe.id)
+
+        res = self.client.get(url)
+        etag = res['ETag']
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+        self.client.patch(url, {'title': 'New title'})
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(res.data['title'], 'New title')
+
+    def test_get_recipe_detail_etag_follows_data(self):
+        """Test ETags change with writes no generation bump saw."""
+        recipe = create_recipe(user=self.user)
+        url = detail_url(recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        # As if written through another worker's per-process cache.
+        Recipe.objects.filter(pk=recipe.pk).update(title='New title')
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'New title')
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_list_recipes_fast_path_matches_serializer(self):
+        """Test the fast list path renders the same bytes."""
+        for i in range(3):
+            recipe = create_recipe(
+                user=self.user,
+                title=f'Recipe {i}',
+                price=Decimal(f'{i}.5'),
+                link='' if i else 'http://example.com',
+            )
+            for name in (f'Tag {i}', 'Shared'):
+                tag, _ = Tag.objects.get_or_create(user=self.user, name=name)
+                recipe.tags.add(tag)
+        Ingredient.objects.create(user=self.user, name='Salt')
+        recipe.ingredients.add(*Ingredient.objects.all())
+
+        with CaptureQueriesContext(connection) as fast_queries:
+            fast = self.client.get(RECIPES_URL)
+        with override_settings(RECIPE_LIST_FAST_PATH=False):
+            slow = self.client.get(RECIPES_URL)
+
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(fast.content, slow.content)
+        self.assertLessEqual(len(fast_queries.captured_queries), 4)
+
+    def test_list_recipes_sparse_fields(self):
+        """Test ?fields= prunes the response and the queries."""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, {'fields': 'id,title,price'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(res.data['results'][0]), ['id', 'title', 'price'],
+        )
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('core_tag', sql)
+        self.assertNotIn('"time_minutes"', sql)
+
+    def test_retrieve_recipe_omit_and_expand(self):
+        """Test ?omit= drops fields and ?expand= collapses relations."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        recipe.ingredients.add(ingredient)
+
+        res = self.client.get(
+            detail_url(recipe.id),
+            {'omit': 'description,image,image_srcset', 'expand': 'tags'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('description', res.data)
+        self.assertNotIn('image_srcset', res.data)
+        self.assertEqual(res.data['tags'], [{'id': tag.id, 'name': 'Vegan'}])
+        self.assertEqual(res.data['ingredients'], [ingredient.id])
+
     def test_create_recipe(self):
         """Test creating a recipe."""
         payload = {
@@ -280,6 +474,27 @@ class PrivateRecipeApiTests(TestCase):
         self.assertIn(tag_lunch, recipe.tags.all())
         self.assertNotIn(tag_breakfast, recipe.tags.all())
 
+    def test_update_recipe_tags_keeps_unchanged_links(self):
+        """Test updating tags only replaces the links that changed."""
+        tag_keep = Tag.objects.create(user=self.user, name='Keep')
+        tag_drop = Tag.objects.create(user=self.user, name='Drop')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag_keep, tag_drop)
+        through = Recipe.tags.through
+        kept_link = through.objects.get(recipe=recipe, tag=tag_keep)
+
+        payload = {'tags': [{'name': 'Keep'}, {'name': 'New'}]}
+        url = detail_url(recipe.id)
+        res = self.client.patch(url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(through.objects.filter(id=kept_link.id).exists())
+        self.assertNotIn(tag_drop, recipe.tags.all())
+        self.assertEqual(
+            set(recipe.tags.values_list('name', flat=True)),
+            {'Keep', 'New'},
+        )
+
     def test_clear_recipe_tags(self):
         """Test clearing a recipes tags."""
         tag = Tag.objects.create(user=self.user, name='Dessert')
@@ -379,6 +594,35 @@ class PrivateRecipeApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.ingredients.count(), 0)
 
+    def test_create_recipe_query_count_independent_of_items(self):
+        """Test creating a recipe costs the same queries for 1 or 30 items."""
+        def create_with(count):
+            payload = {
+                'title': f'Recipe with {count} items',
+                'time_minutes': 30,
+                'price': Decimal('5.00'),
+                'tags': [{'name': f'Tag {i}'} for i in range(count)],
+                'ingredients': [
+                    {'name': f'Ingredient {i}'} for i in range(count)
+                ],
+            }
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(RECIPES_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(ctx.captured_queries)
+
+        small = create_with(1)
+        large = create_with(30)
+
+        self.assertEqual(small, large)
+        recipe = Recipe.objects.get(title='Recipe with 30 items')
+        self.assertEqual(recipe.tags.count(), 30)
+        self.assertEqual(recipe.ingredients.count(), 30)
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(),
+            30,
+        )
+
     def test_filter_by_tags(self):
         """Test filtering recipes by tags."""
         r1 = create_recipe(user=self.user, title='Thai Vegetable Curry')
@@ -418,6 +662,138 @@ class PrivateRecipeApiTests(TestCase):
         self.assertIn(s1.data, res.data)
         self.assertIn(s2.data, res.data)
         self.assertNotIn(s3.data, res.data)
+
+    def test_filter_by_tags_match_all(self):
+        """Test filtering recipes having all of the given tags."""
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Quick')
+        r1 = create_recipe(user=self.user, title='Vegan Stir Fry')
+        r1.tags.add(tag1, tag2)
+        r2 = create_recipe(user=self.user, title='Vegan Stew')
+        r2.tags.add(tag1)
+
+        params = {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [item['id'] for item in res.data['results']]
+        self.assertIn(r1.id, ids)
+        self.assertNotIn(r2.id, ids)
+
+    def test_filter_uses_semi_join_without_distinct(self):
+        """Test related filters compile to EXISTS rather than DISTINCT."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Tofu')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+        params = {'tags': f'{tag.id}', 'ingredients': f'{ingredient.id}'}
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe_sql = [
+            query['sql'] for query in ctx.captured_queries
+            if 'FROM "core_recipe"' in query['sql']
+        ]
+        self.assertTrue(recipe_sql)
+        for sql in recipe_sql:
+            self.assertNotIn('DISTINCT', sql)
+            self.assertIn('EXISTS', sql)
+
+    def bulk_import(self, rows):
+        """Post rows to the bulk import endpoint as JSON Lines."""
+        body = '\n'.join(
+            row if isinstance(row, str) else json.dumps(row) for row in rows
+        )
+        return self.client.generic(
+            'POST', BULK_URL, body, content_type='application/x-ndjson',
+        )
+
+    def test_bulk_import(self):
+        """Test importing recipes reports a result for every row."""
+        Tag.objects.create(user=self.user, name='Vegan')
+        rows = [
+            {
+                'title': 'Curry',
+                'time_minutes': 30,
+                'price': '5.50',
+                'description': 'Spicy',
+                'tags': [{'name': 'Vegan'}, {'name': 'Dinner'}],
+                'ingredients': [{'name': 'Rice'}],
+            },
+            {'title': 'No time or price'},
+            'not json',
+            {'title': 'Salad', 'time_minutes': 5, 'price': '3.00'},
+        ]
+
+        res = self.bulk_import(rows)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['created'], 2)
+        self.assertEqual(res.data['failed'], 2)
+        results = res.data['results']
+        self.assertEqual([result['row'] for result in results], [1, 2, 3, 4])
+        self.assertIn('time_minutes', results[1]['errors'])
+        self.assertIn('errors', results[2])
+        curry = Recipe.objects.get(pk=results[0]['id'])
+        self.assertEqual(curry.user, self.user)
+        self.assertEqual(curry.description, 'Spicy')
+        self.assertEqual(
+            sorted(curry.tags.values_list('name', flat=True)),
+            ['Dinner', 'Vegan'],
+        )
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(curry.ingredients.get().name, 'Rice')
+
+    @override_settings(RECIPE_BULK_BATCH_SIZE=100)
+    def test_bulk_import_query_count_independent_of_rows(self):
+        """Test a batch of rows is written with a fixed number of queries."""
+        def import_with(count):
+            rows = [
+                {
+                    'title': f'Recipe {count}-{i}',
+                    'time_minutes': 10,
+                    'price': '1.00',
+                    'tags': [{'name': f'Tag {i}'}],
+                    'ingredients': [{'name': f'Ingredient {i}'}],
+                }
+                for i in range(count)
+            ]
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.bulk_import(rows)
+            self.assertEqual(res.data['created'], count)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(import_with(2), import_with(50))
+
+    def test_export_recipes(self):
+        """Test exporting streams every recipe of the user as JSON Lines."""
+        other_user = create_user(email='other@example.com', password='test123')
+        create_recipe(user=other_user)
+        r1 = create_recipe(user=self.user, title='First')
+        r1.tags.create(user=self.user, name='Vegan')
+        r1.ingredients.create(user=self.user, name='Tofu')
+        r2 = create_recipe(user=self.user, title='Second')
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        rows = [
+            json.loads(line)
+            for line in b''.join(res.streaming_content).splitlines()
+        ]
+        self.assertEqual([row['id'] for row in rows], [r2.id, r1.id])
+        detail = RecipeDetailSerializer(r1).data
+        for field in ('title', 'time_minutes', 'price', 'link', 'tags',
+                      'ingredients', 'description'):
+            self.assertEqual(rows[1][field], json.loads(
+                json.dumps(detail[field])
+            ))
+
     # def test_filter_recipes_by_tagname(self):
     #     """Test filtering recipes by tags"""
     #     r1= create_recipe(user=self.user, title='Thai Vegetable Curry')
@@ -468,6 +844,9 @@ class ImageUploadTests(TestCase):
         self.recipe = create_recipe(user=self.user)
 
     def tearDown(self):
+        for job in self.recipe.image_jobs.all():
+            for rendition in job.renditions:
+                rendition_storage.delete(rendition['name'])
         self.recipe.image.delete()
 
     def test_upload_image(self):
@@ -481,9 +860,88 @@ class ImageUploadTests(TestCase):
             res = self.client.post(url, payload, format='multipart')
 
         self.recipe.refresh_from_db()
-        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
         self.assertIn('image', res.data)
+        self.assertIn('status_url', res.data)
+        self.assertEqual(res['Location'], res.data['status_url'])
         self.assertTrue(os.path.exists(self.recipe.image.path))
+
+    @override_settings(IMAGE_PIPELINE_WORKERS=0)
+    def test_upload_image_renditions(self):
+        """Test an uploaded image is processed into stripped renditions."""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            img = Image.new('RGB', (400, 300))
+            exif = Image.Exif()
+            exif[0x010F] = 'Camera maker'
+            img.save(image_file, format='JPEG', exif=exif)
+            image_file.seek(0)
+            payload = {'image': image_file}
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(url, payload, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        res = self.client.get(res.data['status_url'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['status'], ImageJob.Status.DONE)
+        # WebP support depends on how Pillow was built.
+        formats = [fmt for fmt in ('jpeg', 'webp') if can_encode(fmt)]
+        self.assertEqual(
+            sorted((r['width'], r['format']) for r in res.data['renditions']),
+            [(width, fmt) for width in (320, 400) for fmt in formats],
+        )
+        job = self.recipe.image_jobs.get()
+        for rendition in job.renditions:
+            with rendition_storage.open(rendition['name']) as rendered:
+                self.assertFalse(Image.open(rendered).getexif())
+        self.recipe.refresh_from_db()
+        self.assertEqual(job.source, self.recipe.image.name)
+        with self.recipe.image.open() as original:
+            self.assertFalse(Image.open(original).getexif())
+
+    @override_settings(IMAGE_PIPELINE_WORKERS=0)
+    def test_upload_image_skips_unsupported_formats(self):
+        """Test formats Pillow cannot write don't fail the job."""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (400, 300)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            with patch('core.images.can_encode', lambda fmt: fmt != 'webp'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.post(
+                        url, {'image': image_file}, format='multipart',
+                    )
+
+        job = self.recipe.image_jobs.get()
+        self.assertEqual(job.status, ImageJob.Status.DONE)
+        self.assertEqual(
+            {rendition['format'] for rendition in job.renditions},
+            {'jpeg'},
+        )
+
+    @override_settings(IMAGE_PIPELINE_WORKERS=0)
+    def test_replaced_image_renditions_deleted(self):
+        """Test replacing an image deletes the renditions of the old one."""
+        url = image_upload_url(self.recipe.id)
+        for color in ('red', 'blue'):
+            with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+                img = Image.new('RGB', (400, 300), color)
+                img.save(image_file, format='JPEG')
+                image_file.seek(0)
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.post(
+                        url, {'image': image_file}, format='multipart',
+                    )
+
+        old_job, new_job = self.recipe.image_jobs.order_by('pk')
+        self.assertEqual(old_job.renditions, [])
+        self.assertFalse(
+            rendition_storage.exists(job_rendition_dir(old_job.pk))
+        )
+        self.assertTrue(new_job.renditions)
+        for rendition in new_job.renditions:
+            self.assertTrue(rendition_storage.exists(rendition['name']))
         
     # def up_load_image(self):
     #     """ test uploading image"""
@@ -9,23 +9,60 @@ from drf_spectacular.utils import (
 )
 
 
+from django.db.models import (
+    Count,
+    Exists,
+    OuterRef,
+    Subquery,
+)
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
 from rest_framework import (
     viewsets,
     mixins,
     status,
 )
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.pagination import PageNumberPagination
 
+from core.authentication import CachedTokenAuthentication
+from core.images import enqueue_image_job
 from core.models import (
+    ImageJob,
     Recipe,
     Tag,
     Ingredient,
 )
-from recipe import serializers
+from core.cache import CachedListMixin, ConditionalGetMixin
+from core.fieldsets import (
+    FIELDSET_PARAMETERS,
+    SparseQuerysetMixin,
+    get_fieldset,
+)
+from core.pagination import (
+    CursorPaginationMixin,
+    RecipeAttrCursorPagination,
+    RecipeAttrPagination,
+    RecipeCursorPagination,
+)
+from recipe import bulk, serializers
+
+
+PAGINATION_PARAMETERS = [
+    OpenApiParameter(
+        'pagination',
+        OpenApiTypes.STR, enum=['cursor'],
+        description='Use cursor (keyset) pagination instead of offsets.',
+    ),
+    OpenApiParameter(
+        'cursor',
+        OpenApiTypes.STR,
+        description='Opaque cursor returned by the previous cursor page.',
+    ),
+]
 
 
 @extend_schema_view(
@@ -41,35 +78,99 @@ from recipe import serializers
                 OpenApiTypes.STR,
                 description='Comma separated list of ingredient IDs to filter',
             ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR, enum=['any', 'all'],
+                description=(
+                    'Return recipes linked to any (default) or all of the '
+                    'given tag/ingredient IDs.'
+                ),
+            ),
+            *PAGINATION_PARAMETERS,
+            *FIELDSET_PARAMETERS,
         ]
-    )
+    ),
+    retrieve=extend_schema(parameters=FIELDSET_PARAMETERS),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin,
+                    CachedListMixin,
+                    CursorPaginationMixin,
+                    SparseQuerysetMixin,
+                    viewsets.ModelViewSet):
     """View for manage recipe APIs."""
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    cursor_pagination_class = RecipeCursorPagination
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def _params_to_ints(self, qs):
         """Convert a list of strings to integers."""
         return [int(str_id) for str_id in qs.split(',')]
 
+    def _filter_by_related(self, queryset, through, column, ids, match_all):
+        """Filter recipes linked to any (or all) of ids with a semi-join."""
+        links = through.objects.filter(
+            recipe_id=OuterRef('pk'),
+            **{f'{column}__in': ids},
+        )
+        if not match_all:
+            return queryset.filter(Exists(links))
+
+        matches = links.order_by().values('recipe_id').annotate(
+            count=Count('pk'),
+        ).values('count')
+        alias = f'{column}_matches'
+        return queryset.alias(**{alias: Subquery(matches)}).filter(
+            **{alias: len(set(ids))}
+        )
+
     def get_queryset(self):
         """Retrieve recipes for authenticated user."""
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        match_all = self.request.query_params.get('match') == 'all'
         queryset = self.queryset
         if tags:
             tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = self._filter_by_related(
+                queryset, Recipe.tags.through, 'tag_id', tag_ids, match_all,
+            )
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = self._filter_by_related(
+                queryset, Recipe.ingredients.through, 'ingredient_id',
+                ingredient_ids, match_all,
+            )
 
-        return queryset.filter(
-            user=self.request.user
-        ).order_by('-id').distinct()
+        queryset = queryset.filter(user=self.request.user).order_by('-id')
+        if self.use_fast_list():
+            return queryset.values(*serializers.RecipeListReader.columns)
+        if self.action in ('list', 'retrieve'):
+            queryset = self.prune_queryset(queryset, prefetch={
+                'tags': Tag.objects.only('id', 'name').order_by('id'),
+                'ingredients': (
+                    Ingredient.objects.only('id', 'name').order_by('id')
+                ),
+            })
+
+        return queryset
+
+    def use_fast_list(self):
+        """Return True if the list is built by RecipeListReader."""
+        return (
+            settings.RECIPE_LIST_FAST_PATH
+            and self.action == 'list'
+            and get_fieldset(self.request) is None
+        )
+
+    def get_serializer(self, *args, **kwargs):
+        """Return the serializer, or the fast list reader for lists."""
+        # Without a page (e.g. for the schema) the real serializer is used.
+        if kwargs.get('many') and self.use_fast_list():
+            page, = args
+            return serializers.RecipeListReader(page)
+        return super().get_serializer(*args, **kwargs)
 
     def get_serializer_class(self):
         """Return the serializer class for request."""
@@ -77,6 +178,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'image_job':
+            return serializers.ImageJobSerializer
+        elif self.action == 'bulk_import':
+            return serializers.RecipeBulkSerializer
 
         return self.serializer_class
 
@@ -84,18 +189,77 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Create a new recipe."""
         serializer.save(user=self.request.user)
 
+    @extend_schema(
+        request={bulk.NDJSONParser.media_type: OpenApiTypes.OBJECT},
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(
+        methods=['POST'],
+        detail=False,
+        url_path='bulk',
+        parser_classes=[bulk.NDJSONParser],
+    )
+    def bulk_import(self, request):
+        """Create recipes from a JSON Lines body, one recipe per line."""
+        results = bulk.import_recipes(request.data, self.get_serializer())
+        created = sum('id' in result for result in results)
+        return Response({
+            'created': created,
+            'failed': len(results) - created,
+            'results': results,
+        })
+
+    @extend_schema(responses={
+        (200, bulk.NDJSONParser.media_type): OpenApiTypes.OBJECT,
+    })
+    @action(methods=['GET'], detail=False)
+    def export(self, request):
+        """Stream the user's recipes as JSON Lines."""
+        queryset = self.filter_queryset(self.get_queryset())
+        return StreamingHttpResponse(
+            bulk.export_recipes(queryset),
+            content_type=bulk.NDJSONParser.media_type,
+        )
+
+    @extend_schema(responses={202: serializers.ImageJobSerializer})
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
-        """Upload an image to recipe."""
+        """Upload an image to recipe and queue it for processing."""
         recipe = self.get_object()
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            job = ImageJob.objects.create(
+                recipe=recipe,
+                source=recipe.image.name,
+            )
+            enqueue_image_job(job)
+            data = serializers.ImageJobSerializer(
+                job,
+                context=self.get_serializer_context(),
+            ).data
+            return Response(
+                data,
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Location': data['status_url']},
+            )
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(
+        methods=['GET'],
+        detail=True,
+        url_path=r'image-jobs/(?P<job_id>\d+)',
+        url_name='image-job',
+    )
+    def image_job(self, request, pk=None, job_id=None):
+        """Return the processing status of an uploaded image."""
+        recipe = self.get_object()
+        job = get_object_or_404(recipe.image_jobs, pk=job_id)
+        serializer = self.get_serializer(job)
+        return Response(serializer.data)
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -105,18 +269,29 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 OpenApiTypes.INT, enum=[0, 1],
                 description='Filter by items assigned to recipes.',
             ),
+            OpenApiParameter(
+                'page_size',
+                OpenApiTypes.STR,
+                description=(
+                    'Number of items per page (max 1000), or "all" to return '
+                    'every item in one response.'
+                ),
+            ),
+            *PAGINATION_PARAMETERS,
         ]
     )
 )
-class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
+class BaseRecipeAttrViewSet(CachedListMixin,
+                            CursorPaginationMixin,
+                            mixins.DestroyModelMixin,
                             mixins.UpdateModelMixin,
                             mixins.ListModelMixin,
                             viewsets.GenericViewSet):
     """Base viewset for recipe attributes."""
-    authentication_classes = [TokenAuthentication]
+    cursor_pagination_class = RecipeAttrCursorPagination
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
-    pagination_class = PageNumberPagination
-    pagination_class.page_size = 1
+    pagination_class = RecipeAttrPagination
 
     def get_queryset(self):
         """Filter queryset to authenticated user."""
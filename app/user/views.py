@@ -1,10 +1,17 @@
 """
 Views for the user API.
 """
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+from rest_framework_simplejwt import views as jwt_views
 
+from core.authentication import CachedTokenAuthentication
+from core.throttling import (
+    LoginEmailThrottle,
+    LoginIPThrottle,
+    SignupIPThrottle,
+)
 from user.serializers import (
     UserSerializer,
     AuthTokenSerializer,
@@ -14,18 +21,27 @@ from user.serializers import (
 class CreateUserView(generics.CreateAPIView):
     """Create a new user in the system."""
     serializer_class = UserSerializer
+    authentication_classes = []
+    throttle_classes = [SignupIPThrottle]
 
 
 class CreateTokenView(ObtainAuthToken):
     """Create a new auth token for user."""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    authentication_classes = []
+    throttle_classes = [LoginIPThrottle, LoginEmailThrottle]
+
+
+class TokenObtainPairView(jwt_views.TokenObtainPairView):
+    """Create a JWT access and refresh token pair for user."""
+    throttle_classes = [LoginIPThrottle, LoginEmailThrottle]
 
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated user."""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
@@ -1,13 +1,48 @@
 server {
     listen ${LISTEN_PORT};
 
-    location/static {
+    location /static {
         alias /vol/static;
     }
 
+    # Partial chunked uploads and logs share the volume but are never
+    # served.
+    location /static/tmp/ {
+        deny all;
+    }
+
+    location /static/logs/ {
+        deny all;
+    }
+
+    # Renditions are content-addressed, so they never change once written.
+    location /static/media/renditions/ {
+        alias /vol/static/media/renditions/;
+        expires max;
+        add_header Cache-Control "public, immutable";
+    }
+
+    # Chunked uploads are streamed to the app instead of buffered first.
+    location /api/media/uploads/ {
+        uwsgi_pass              ${APP_HOST}:${APP_PORT};
+        include                 /etc/nginx/uwsgi_params;
+        client_max_body_size    10M;
+        uwsgi_request_buffering off;
+    }
+
+    # Bulk imports are read line by line and exports streamed as they are
+    # generated, so neither is buffered by the proxy.
+    location ~ ^/api/recipe/recipes/(bulk|export)/$ {
+        uwsgi_pass              ${APP_HOST}:${APP_PORT};
+        include                 /etc/nginx/uwsgi_params;
+        client_max_body_size    100M;
+        uwsgi_request_buffering off;
+        uwsgi_buffering         off;
+    }
+
     location / {
         uwsgi_pass              ${APP_HOST}:${APP_PORT};
         include                 /etc/nginx/uwsgi_params;
         client_max_body_size    10M;
     }
-}
\ No newline at end of file
+}
@@ -7,4 +7,16 @@ python manage.py collectstatic --noinput
 # python manage.py makemigrations
 python manage.py migrate
 
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
\ No newline at end of file
+# Workers write their metrics here for /api/metrics/ to sum; the counts
+# start over with the server.
+export METRICS_DIR=${METRICS_DIR:-/tmp/metrics}
+rm -rf "$METRICS_DIR"
+mkdir -p "$METRICS_DIR"
+
+# Refuse to start with settings that are unsafe with several workers.
+python manage.py check --deploy --fail-level ERROR
+
+# Threads let a worker serve other requests while logins wait on the
+# password hash pool.
+uwsgi --socket :9000 --workers 4 --threads ${UWSGI_THREADS:-4} \
+    --master --enable-threads --module app.wsgi
\ No newline at end of file